@@ -1,5 +1,6 @@
 import json
 from collections import defaultdict
+from typing import Type, Union
 
 from django.http import JsonResponse
 from django.utils.decorators import method_decorator
@@ -7,7 +8,8 @@ from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.decorators.csrf import csrf_exempt
 
-from backend.models import StringValue, ItemTemplate, Item, Category, ItemTemplateField, FileValue
+from backend.models import StringValue, ItemTemplate, Item, Category, ItemTemplateField, FileValue, Container, DictBatch
+from backend.models.base import _TreeNode
 from backend import queries
 from backend.queries import filter_items
 
@@ -47,6 +49,21 @@ class GetValues(View):
         return JsonResponse([value.value for value in values], safe=False)
 
 
+class GetFacets(View):
+    max_limit = 100
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(max(int(request.GET.get("limit", 10)), 1), self.max_limit)
+        except ValueError:
+            return JsonResponse({"success": False, "error": "Parameter 'limit' must be an integer"}, status=400)
+        try:
+            items = filter_items(request.GET.get("query", ""))
+        except ValueError as err:
+            return JsonResponse({"success": False, "error": str(err)}, status=400)
+        return JsonResponse({"success": True, "result": queries.get_facets(items, limit)})
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class UploadFile(View):
 
@@ -57,6 +74,14 @@ class UploadFile(View):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class ItemView(View):
+    """
+    Get, create, update and delete items
+
+    Listing items takes an optional `query` and `sort` (key optionally followed by ":desc")
+    and is paginated using the `next` cursor of the previous page.
+    """
+    page_size = 100
+    max_page_size = 1000
 
     @staticmethod
     def _prepare_fields(fields: dict):
@@ -96,12 +121,12 @@ class ItemView(View):
         return fields_by_type, errors
 
     @staticmethod
-    def _set_fields(item: Item, fields_by_type: dict):
+    def _set_fields(item: Union[Item, DictBatch], fields_by_type: dict):
         """
         Perform the bulk lookups of ValueModels and set them to an Item
 
-        :param item: Item instance to set fields for
-        :type item: Item
+        :param item: Item instance (or a batch of changes to one) to set fields for
+        :type item: Item or DictBatch
         :param fields_by_type: prepared dict of fields as returned by _prepare_fields
         :type fields_by_type: dict
         """
@@ -128,13 +153,29 @@ class ItemView(View):
 
     def get(self, request, pk=None, *args, **kwargs):
         if pk is None:
-            items = Item.objects.all()
-            if "query" in request.GET:
-                items = filter_items(request.GET.get("query"))
-            return JsonResponse(
-                [self.item2dict(item, False) for item in items],
-                status=200, safe=False
-            )
+            try:
+                limit = int(request.GET.get("limit", self.page_size))
+            except ValueError:
+                return JsonResponse({"success": False, "error": "limit must be an integer"}, status=400)
+            if not 0 < limit <= self.max_page_size:
+                return JsonResponse({"success": False, "error": f"limit must be between 1 and {self.max_page_size}"},
+                                    status=400)
+            query = request.GET.get("query", "")
+            try:
+                items = filter_items(query)
+                if request.GET.get("sort"):
+                    items = queries.sort_items(items, request.GET["sort"])
+                items, next_cursor = queries.paginate(items.select_related("template"),
+                                                      request.GET.get("cursor"), limit)
+                total = queries.count_items(query)
+            except ValueError as err:
+                return JsonResponse({"success": False, "error": str(err)}, status=400)
+            Item.populate_objects(items)
+            return JsonResponse({"success": True, "result": {
+                "items": [self.item2dict(item, False) for item in items],
+                "next": next_cursor,
+                "total": total,
+            }})
         else:
             try:
                 return JsonResponse(self.item2dict(Item.objects.get(id=pk)))
@@ -177,8 +218,9 @@ class ItemView(View):
             item.category_id = data["category"]
         item.save()
         if "fields" in data:
-            item.clear()
-            self._set_fields(item, fields_by_type)
+            with item.batch() as fields:
+                fields.clear()
+                self._set_fields(fields, fields_by_type)
 
         return JsonResponse(
             {"success": True, "result": self.item2dict(item)},
@@ -212,17 +254,23 @@ class ItemTemplateView(View):
         return result, errors
 
     @staticmethod
-    def template2dict(template: ItemTemplate):
+    def template2dict(template: ItemTemplate, fields: dict = None, own_fields: list = None):
+        if fields is None:
+            fields = template.get_fields()
+        if own_fields is None:
+            own_fields = list(template.itemtemplatefield_set.values_list("key__value", flat=True))
         return {"id": template.id, "name": template.name,
                 "item_name": template.name_format,
-                "fields": dict((key, model.api_name) for key, model in template.get_fields().items()),
+                "fields": dict((key, model.api_name) for key, model in fields.items()),
                 "parent": {"id": template.parent.id, "name": template.parent.name},
-                "ownFields": list(template.itemtemplatefield_set.values_list("key__value", flat=True))}
+                "ownFields": own_fields}
 
     def get(self, request, *args, pk=None, **kwargs):
         if pk is None:
+            templates = list(ItemTemplate.objects.select_related("parent"))
+            resolved = ItemTemplate.resolve_all_fields(templates)
             return JsonResponse(
-                [self.template2dict(template) for template in ItemTemplate.objects.all()],
+                [self.template2dict(template, *resolved[template.id]) for template in templates],
                 status=200, safe=False
             )
         else:
@@ -257,11 +305,8 @@ class ItemTemplateView(View):
         if "parent" in data:
             if not ItemTemplate.objects.filter(id=data["parent"]).exists():
                 return JsonResponse({"success": False, "error": "Unknown parent"}, status=404)
-            elif pk is not None:
-                for child in ItemTemplate(id=data["parent"]).obj_path:
-                    if child.id == pk:
-                        return JsonResponse({"success": False, "error": "Can't set a child or self as parent"},
-                                            status=400)
+            elif pk is not None and pk in ItemTemplate(id=data["parent"]).path_ids:
+                return JsonResponse({"success": False, "error": "Can't set a child or self as parent"}, status=400)
         if "fields" in data:
             fields, errors = self._prepare_fields(data["fields"])
             if errors:
@@ -293,6 +338,7 @@ class ItemTemplateView(View):
             ItemTemplateField.objects.filter(template=template).delete()
             ItemTemplateField.objects.bulk_create([ItemTemplateField(template=template, key=key, value_type=value_type)
                                                    for key, value_type in fields.items()])
+            ItemTemplate.invalidate_fields(template.id)  # bulk_create doesn't send post_save
 
         return JsonResponse(
             {"success": True, "result": self.template2dict(template)},
@@ -308,7 +354,69 @@ class ItemTemplateView(View):
         except ItemTemplate.DoesNotExist:
             return JsonResponse({"success": False, "error": "Unknown template"}, status=404)
 
+        items = list(template.item_set.values_list("id", flat=True))
         template.item_set.update(template_id=template.parent_id)
         template.delete()
+        Item.render_names(Item.objects.filter(id__in=items))
 
         return JsonResponse({"success": True}, status=200)
+
+
+class TreeChildrenView(View):
+    """
+    Lazily load a `Container` / `Category` / `ItemTemplate` tree.
+
+    The direct children of a node are paginated using the last child's id as cursor.
+    Their children are queried up to `depth` layers and returned in the format `ContainerTree` (see `trees.js`) expects.
+    """
+    model: Type[_TreeNode] = None
+    page_size = 100
+    max_page_size = 1000
+
+    @staticmethod
+    def node2dict(node: _TreeNode):
+        result = {
+            "name": node.name,
+            "parent": node.parent_id,
+            "children": [child.id for child in node.children] if node.children_loaded else None,
+        }
+        if isinstance(node, Container):
+            result["amount"] = node.direct_amount
+            result["totalAmount"] = node.total_amount
+        return result
+
+    def get(self, request, *args, pk=None, **kwargs):
+        try:
+            depth = int(request.GET.get("depth", 1))
+            limit = int(request.GET.get("limit", self.page_size))
+            cursor = int(request.GET.get("cursor", -1))
+        except ValueError:
+            return JsonResponse({"success": False, "error": "depth, limit and cursor must be integers"}, status=400)
+        if depth < 1 or not 0 < limit <= self.max_page_size:
+            return JsonResponse({"success": False,
+                                 "error": f"depth must be positive and limit between 1 and {self.max_page_size}"},
+                                status=400)
+
+        if not self.model.objects.filter(id=pk).exists():
+            return JsonResponse({"success": False, "error": f"Unknown {self.model.__name__.lower()}"}, status=404)
+
+        # Query one page of direct children (and one more to know whether there is a next page)
+        page = list(self.model.objects.filter(parent_id=pk, id__gt=cursor).exclude(id=pk).order_by("id")[:limit + 1])
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = page[-1].id
+
+        # Query their subtrees
+        for node in page:
+            node.children_loaded = depth > 1
+        nodes = {}
+        if depth > 1 and page:
+            nodes = self.model.query_subtrees(page, depth - 1)
+
+        return JsonResponse({"success": True, "result": {
+            "parent": pk,
+            "children": [node.id for node in page],
+            "next": next_cursor,
+            "nodes": dict((node.id, self.node2dict(node)) for node in page + list(nodes.values())),
+        }})
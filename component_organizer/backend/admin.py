@@ -24,5 +24,7 @@ class ItemTemplateAdmin(admin.ModelAdmin):
 
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
-    pass
+    list_display = ("display_name", "template", "category")
+    search_fields = ("display_name",)
+    ordering = ("display_name",)
 
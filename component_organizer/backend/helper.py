@@ -1,4 +1,15 @@
 import enum
+import math
+import threading
+import uuid
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+from typing import Any, Hashable, Mapping, Tuple
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
 
 
 class UnicodeEscape(enum.Enum):
@@ -8,3 +19,183 @@ class UnicodeEscape(enum.Enum):
 
     def __str__(self):
         return self.value
+
+
+SI_PREFIXES = {
+    "p": -12,
+    "n": -9,
+    "u": -6,
+    "\u00B5": -6,  # micro sign
+    "\u03BC": -6,  # greek mu
+    "m": -3,
+    "k": 3,
+    "M": 6,
+    "G": 9,
+}
+
+# Units an SI prefix is split from, so "m/s", "m²" or "mol" aren't mistaken for milli and "ppm" for pico
+PREFIXABLE_UNITS = {
+    "\u2126", "\u03A9",  # ohm sign and greek omega
+    "V", "A", "W", "F", "H", "Hz", "s", "S", "g", "m", "l", "L", "J", "C", "T", "Wb", "N", "Pa", "K",
+    "Wh", "Ah", "VA", "var", "eV", "bar", "B", "b", "cd", "lm", "lx",
+}
+
+
+def split_unit(unit: str) -> Tuple[int, str]:
+    """
+    Split a unit into its SI prefix' exponent and its base unit
+
+    Only prefixes of the units in `PREFIXABLE_UNITS` are split, other units are returned unchanged.
+
+    :param unit: unit to split, for example "k\u2126"
+    :type unit: str
+    :return: (exponent, base unit), for example (3, "\u2126")
+    :rtype: tuple of int and str
+    """
+    unit = unit.strip()
+    if len(unit) > 1 and unit[0] in SI_PREFIXES and unit[1:] in PREFIXABLE_UNITS:
+        return SI_PREFIXES[unit[0]], unit[1:]
+    else:
+        return 0, unit
+
+
+def canonicalize_unit(number: float, unit: str) -> Tuple[float, str]:
+    """
+    Convert a number with a prefixed unit into a number in the base unit
+
+    The scaling is done in decimal to get 4700 instead of 4700.000000000001 from 4.7 k.
+
+    :param number: number in the given unit
+    :type number: float
+    :param unit: unit which might have an SI prefix
+    :type unit: str
+    :return: (number, base unit)
+    :rtype: tuple of float and str
+    """
+    exponent, base_unit = split_unit(unit)
+    number = float(number)
+    if exponent:
+        number = float(Decimal(repr(number)).scaleb(exponent))
+    return number, base_unit
+
+
+def parse_percentage(string: str) -> Decimal:
+    """
+    Parse a percentage like "10%" or "0.5 %"
+
+    :param string: number followed by a percent sign
+    :type string: str
+    :return: the number without dividing it by 100
+    :rtype: Decimal
+    :raises ValueError: when the string is no finite number followed by a percent sign
+    """
+    string = string.strip()
+    if not string.endswith("%"):
+        raise ValueError(f"{string!r} is no percentage")
+    try:
+        number = Decimal(string[:-1].strip())
+    except InvalidOperation:
+        raise ValueError(f"{string!r} is no percentage")
+    if not math.isfinite(float(number)):
+        raise ValueError(f"{string!r} is not finite")
+    return number
+
+
+class LRUCache:
+    """
+    Thread safe mapping which forgets its least recently used entries when exceeding its size
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up a key and mark it as recently used
+
+        :param key: key to look up
+        :type key: hashable
+        :param default: value to return if the key isn't cached
+        :return: cached value or default
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            else:
+                self.misses += 1
+                return default
+
+    def update(self, entries: Mapping):
+        """
+        Add several entries at once and evict the least recently used ones
+
+        :param entries: mapping of keys to values to cache
+        :type entries: mapping
+        """
+        if self.size <= 0:
+            return
+        with self._lock:
+            for key, value in entries.items():
+                self._data[key] = value
+                self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def __setitem__(self, key: Hashable, value: Any):
+        self.update({key: value})
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable):
+        return key in self._data
+
+
+def get_version(name: str) -> str:
+    """
+    Get a version shared by all processes through Django's cache
+
+    Process local caches store the version they were filled at and drop their content when it changed.
+    This relies on the default cache being shared by all processes, like the file based one in settings.CACHES.
+    A version is a random token instead of a counter, so an evicted one is never mistaken for an older one.
+
+    :param name: cache key of the version
+    :type name: str
+    :return: current version
+    :rtype: str
+    """
+    return cache.get_or_set(name, lambda: uuid.uuid4().hex, timeout=None)
+
+
+def bump_version(name: str):
+    """
+    Replace a version shared through Django's cache once the current transaction commits
+
+    :param name: cache key of the version
+    :type name: str
+    """
+    transaction.on_commit(lambda: cache.set(name, uuid.uuid4().hex, timeout=None))
+
+
+def is_cache_shared() -> bool:
+    """
+    Check whether the default cache is shared with other processes, which `get_version` relies on
+
+    :return: whether the default cache is neither process local nor a dummy
+    :rtype: bool
+    """
+    return not isinstance(caches["default"], (LocMemCache, DummyCache))
@@ -0,0 +1,142 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+
+from backend.models import Item, KeyValuePair, StringValue, FloatValue, KeyTypeUsage, ValueUsage
+from backend.queries import filter_items
+
+
+class Command(BaseCommand):
+    help = "Time the key-value pair lookups on a synthetic catalog with and without the pair indexes. " \
+           "The catalog is created in a separate test database, existing data is not touched."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pairs", type=int, default=1_000_000, help="How many key-value pairs to create")
+        parser.add_argument("--pairs-per-item", type=int, default=10, help="How many pairs each item gets")
+        parser.add_argument("--keys", type=int, default=200, help="How many distinct keys to use")
+        parser.add_argument("--repeat", type=int, default=20, help="How often each query is run")
+        parser.add_argument("--seed", type=int, default=0, help="Seed for the random catalog")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            rng = random.Random(options["seed"])
+            self.populate(rng, options["pairs"], options["pairs_per_item"], options["keys"])
+
+            queries = self.get_queries(rng, options["keys"])
+            with_indexes = self.run_queries(queries, options["repeat"])
+            self.drop_indexes()
+            without_indexes = self.run_queries(queries, options["repeat"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(f"{'query':<24}{'without':>12}{'with':>12}{'speedup':>10}")
+        for name in queries:
+            before, after = without_indexes[name], with_indexes[name]
+            self.stdout.write(f"{name:<24}{before * 1000:>10.2f}ms{after * 1000:>10.2f}ms{before / after:>9.1f}x")
+
+    def populate(self, rng: random.Random, pairs: int, pairs_per_item: int, keys: int):
+        """
+        Create a catalog of items whose pairs are half strings and half floats
+
+        :param rng: source of randomness
+        :type rng: random.Random
+        :param pairs: total number of pairs to create
+        :type pairs: int
+        :param pairs_per_item: number of pairs per item
+        :type pairs_per_item: int
+        :param keys: number of distinct keys
+        :type keys: int
+        """
+        start = time.perf_counter()
+        key_objects = list(StringValue.bulk_get(f"key{i}" for i in range(keys)).values())
+        strings = [v.id for v in StringValue.bulk_get(f"value{i}" for i in range(1000)).values()]
+        floats = [v.id for v in FloatValue.bulk_get(float(i) for i in range(10000)).values()]
+        string_type, float_type = StringValue.content_type(), FloatValue.content_type()
+
+        item_count = pairs // pairs_per_item
+        Item.objects.bulk_create((Item(display_name=f"item{i}") for i in range(item_count)), batch_size=1000)
+        item_ids = list(Item.objects.values_list("id", flat=True))
+
+        batch = []
+        for item_id in item_ids:
+            for key in rng.sample(key_objects, pairs_per_item):
+                if rng.random() < 0.5:
+                    batch.append(KeyValuePair(owner_id=item_id, key_id=key.id,
+                                              value_type=string_type, value_id=rng.choice(strings)))
+                else:
+                    batch.append(KeyValuePair(owner_id=item_id, key_id=key.id,
+                                              value_type=float_type, value_id=rng.choice(floats)))
+            if len(batch) >= 10000:
+                KeyValuePair.objects.bulk_create(batch)
+                batch = []
+        KeyValuePair.objects.bulk_create(batch)
+        # The pairs were created without Dict, so its counters have to be built
+        KeyTypeUsage.rebuild()
+        ValueUsage.rebuild()
+        self.analyze()
+        self.stdout.write(f"Created {item_count} items with {item_count * pairs_per_item} pairs "
+                          f"in {time.perf_counter() - start:.1f}s")
+
+    @staticmethod
+    def get_queries(rng: random.Random, keys: int) -> dict:
+        """
+        Build the queries to time, each one using the same arguments in both runs
+
+        :return: dict from name to a callable running the query
+        :rtype: dict
+        """
+        owner = Item.objects.order_by("?").values_list("id", flat=True).first()
+        key = f"key{rng.randrange(keys)}"
+        value = f"value{rng.randrange(1000)}"
+        owner_keys = list(KeyValuePair.objects.filter(owner_id=owner).values_list("key__value", flat=True))
+
+        return {
+            "owner pairs": lambda: list(KeyValuePair.objects.filter(owner_id=owner)),
+            "owner key": lambda: list(KeyValuePair.objects.filter(owner_id=owner, key__value__in=owner_keys[:3])),
+            "populate": lambda: Item.objects.get(id=owner).populate(),
+            "string lookup": lambda: filter_items(f"{key}={value}").count(),
+            "float range": lambda: filter_items(f"{key}>9990").count(),
+            # Count the pairs themselves, get_keys and get_values read the usage counters instead
+            "key values": lambda: len(KeyValuePair.objects.filter(key__value=key)
+                                                          .values_list("value_type", "value_id")
+                                                          .annotate(uses=Count("id")).order_by()),
+            "key counts": lambda: len(KeyValuePair.objects.values_list("key_id")
+                                                          .annotate(uses=Count("id")).order_by()),
+        }
+
+    @staticmethod
+    def run_queries(queries: dict, repeat: int) -> dict:
+        """
+        Run each query a number of times and take the median duration
+
+        :return: dict from name to seconds
+        :rtype: dict
+        """
+        times = {}
+        for name, query in queries.items():
+            durations = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                query()
+                durations.append(time.perf_counter() - start)
+            durations.sort()
+            times[name] = durations[len(durations) // 2]
+        return times
+
+    def drop_indexes(self):
+        with connection.schema_editor() as schema_editor:
+            for index in KeyValuePair._meta.indexes:
+                schema_editor.remove_index(KeyValuePair, index)
+            for constraint in KeyValuePair._meta.constraints:
+                schema_editor.remove_constraint(KeyValuePair, constraint)
+        self.analyze()
+
+    @staticmethod
+    def analyze():
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from backend.models import Item
+
+
+class Command(BaseCommand):
+    help = "Build the JSON snapshots items are read from instead of their key-value pairs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Rebuild existing snapshots as well")
+        parser.add_argument("--batch-size", type=int, default=500, help="How many items to process at once")
+
+    def handle(self, *args, **options):
+        queryset = Item.objects.all()
+        if not options["all"]:
+            queryset = queryset.filter(snapshot__isnull=True)
+        count = Item.build_snapshots(queryset, batch_size=options["batch_size"])
+        self.stdout.write(f"Built {count} snapshots")
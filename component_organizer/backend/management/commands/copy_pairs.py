@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.models import Item, TypedPair, GenericPairStorage
+
+
+class Command(BaseCommand):
+    help = "Copy the key-value pairs stored in KeyValuePair into TypedPair, " \
+           "run this before switching the DICT_STORAGE setting to \"typed\""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="How many items to process at once")
+
+    def handle(self, *args, **options):
+        storage = GenericPairStorage()
+        count = 0
+        last_id = -1
+        while True:
+            with transaction.atomic():
+                items = list(Item.objects.filter(id__gt=last_id).order_by("id")[:options["batch_size"]])
+                if not items:
+                    break
+                TypedPair.objects.filter(owner__in=items).delete()
+                TypedPair.objects.bulk_create(
+                    TypedPair(owner_id=owner_id, key=key, value_type=value.api_name, **value._typed_columns())
+                    for owner_id, key, value in storage.query_pairs(Item.iter_value_models(), items)
+                )
+            count += len(items)
+            last_id = items[-1].id
+        self.stdout.write(f"Copied the pairs of {count} items")
@@ -0,0 +1,173 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from backend.helper import is_cache_shared
+from backend.models import KeyValuePair, TypedPair, FileValue, UnitValue, FloatValue, StringValue
+from backend.models.dict import _SingleValue
+
+
+class Command(BaseCommand):
+    help = "Delete values which are neither used in a key-value pair, as key nor by another value " \
+           "and remove upload files no FileValue or typed pair refers to. " \
+           "Values are deleted in chunks of ids each in its own transaction, " \
+           "so an interrupted run can be resumed with --model and --start-id. " \
+           "Other processes drop their value cache after each chunk through the shared cache, " \
+           "so this refuses to run when settings.CACHES configures a process local one."
+
+    # Values referencing other values come first, so the referenced ones can be freed in the same run
+    models = [UnitValue, FileValue, FloatValue, StringValue]
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="How many ids to check per transaction")
+        parser.add_argument("--model", choices=[model.api_name for model in self.models],
+                            help="Only collect this value type")
+        parser.add_argument("--start-id", type=int, default=0, help="Id to resume --model from")
+        parser.add_argument("--grace-period", type=int, default=3600,
+                            help="Keep uploaded files younger than this many seconds, "
+                                 "because an upload is stored before an item uses it")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be deleted")
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size has to be positive")
+        if options["start_id"] and not options["model"]:
+            raise CommandError("--start-id requires --model")
+        if not options["dry_run"] and not is_cache_shared():
+            raise CommandError("The other processes can only be told to forget the deleted values "
+                               "through a shared cache, configure one in settings.CACHES")
+        models = self.models
+        if options["model"]:
+            models = [model for model in models if model.api_name == options["model"]]
+
+        for model in models:
+            deleted = self.collect_values(model, options["start_id"], options["batch_size"],
+                                          options["grace_period"], options["dry_run"])
+            self.stdout.write(f"{model.__name__}: {deleted} unused values")
+
+        if not options["model"] or options["model"] == FileValue.api_name:
+            deleted = self.collect_files(options["grace_period"], options["dry_run"])
+            self.stdout.write(f"{deleted} unused files")
+
+    @staticmethod
+    def unused_values(model):
+        """
+        Get a queryset of a value model's instances which aren't referenced anywhere
+
+        :param model: value model to query
+        :type model: subclass of _SingleValue
+        :return: unreferenced values
+        :rtype: QuerySet
+        """
+        queryset = model.objects.exclude(Exists(KeyValuePair.objects.filter(value_type=model.content_type(),
+                                                                            value_id=OuterRef("pk"))))
+        # Foreign keys to the model like KeyValuePair.key, ItemTemplateField.key or UnitValue.unit
+        for relation in model._meta.related_objects:
+            queryset = queryset.exclude(Exists(relation.related_model.objects.filter(
+                **{relation.field.name: OuterRef("pk")}
+            )))
+        # TypedPair stores values inline, but a FileValue's file has to survive as long as a pair refers to it
+        if model is FileValue:
+            queryset = queryset.exclude(Exists(TypedPair.objects.filter(file_path=OuterRef("value"))))
+        return queryset
+
+    def collect_values(self, model, start_id: int, batch_size: int, grace_period: int, dry_run: bool) -> int:
+        """
+        Delete a value model's unused instances one id range at a time
+
+        :return: number of deleted values
+        :rtype: int
+        """
+        last_id = model.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        deleted = 0
+        for start in range(start_id, last_id + 1, batch_size):
+            with transaction.atomic():
+                unused = self.unused_values(model).filter(id__gte=start, id__lt=start + batch_size)
+                if model is FileValue:
+                    unused = unused.filter(id__in=[value.id for value in unused
+                                                   if not self.is_recent(value.value.name, grace_period)])
+                if dry_run:
+                    deleted += unused.count()
+                    continue
+                names = set(unused.values_list("value", flat=True)) if model is FileValue else set()
+                deleted += unused.delete()[1].get(model._meta.label, 0)
+                if names:
+                    # FileValues aren't unique, another one might still refer to the same file
+                    names -= self.used_files(names)
+                    transaction.on_commit(lambda names=names: self.delete_files(names))
+                _SingleValue.clear_cache()
+            if self.verbosity > 1:
+                self.stdout.write(f"{model.__name__}: checked ids up to {start + batch_size - 1}")
+        return deleted
+
+    def collect_files(self, grace_period: int, dry_run: bool) -> int:
+        """
+        Delete files in MEDIA_ROOT which neither a FileValue nor a TypedPair refers to
+
+        :return: number of deleted files
+        :rtype: int
+        """
+        if not os.path.isdir(settings.MEDIA_ROOT):
+            return 0
+        used = self.used_files()
+        deleted = 0
+        for directory, _, files in os.walk(settings.MEDIA_ROOT):
+            for file in files:
+                name = os.path.relpath(os.path.join(directory, file), settings.MEDIA_ROOT).replace(os.sep, "/")
+                if name in used or self.is_recent(name, grace_period):
+                    continue
+                if not dry_run:
+                    default_storage.delete(name)
+                deleted += 1
+        return deleted
+
+    @staticmethod
+    def used_files(names: set = None) -> set:
+        """
+        Get the files a FileValue or a TypedPair refers to
+
+        :param names: only check these files instead of all
+        :type names: set of str
+        :return: file names relative to MEDIA_ROOT
+        :rtype: set of str
+        """
+        values = FileValue.objects.all()
+        pairs = TypedPair.objects.exclude(file_path=None)
+        if names is not None:
+            values = values.filter(value__in=names)
+            pairs = pairs.filter(file_path__in=names)
+        return set(values.values_list("value", flat=True)).union(pairs.values_list("file_path", flat=True))
+
+    @staticmethod
+    def delete_files(names: set):
+        """
+        Delete files from the default storage
+
+        :param names: file names relative to MEDIA_ROOT
+        :type names: set of str
+        """
+        for name in names:
+            default_storage.delete(name)
+
+    @staticmethod
+    def is_recent(name: str, grace_period: int) -> bool:
+        """
+        Check whether a file in MEDIA_ROOT was modified within the grace period
+
+        :param name: file's path relative to MEDIA_ROOT
+        :type name: str
+        :param grace_period: seconds
+        :type grace_period: int
+        :return: whether the file is recent, missing files aren't
+        :rtype: bool
+        """
+        try:
+            return time.time() - os.path.getmtime(os.path.join(settings.MEDIA_ROOT, name)) < grace_period
+        except OSError:
+            return False
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from backend.models import KeyTypeUsage
+
+
+class Command(BaseCommand):
+    help = "Recount which value types are stored under which key, the counts are used to prune item queries"
+
+    def handle(self, *args, **options):
+        KeyTypeUsage.rebuild()
+        self.stdout.write(f"Counted {KeyTypeUsage.objects.count()} key types")
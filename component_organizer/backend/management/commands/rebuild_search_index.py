@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from backend import search
+from backend.models import Item
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full text index of items' names, template names and fields from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="How many items to process at once")
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("The full text index is only supported on SQLite")
+
+        count = 0
+        with transaction.atomic():
+            search.clear()
+            last_id = -1
+            while True:
+                items = Item.populate_queryset(Item.objects.filter(id__gt=last_id)
+                                                           .order_by("id")[:options["batch_size"]])
+                if not items:
+                    break
+                search.index_items(items)
+                count += len(items)
+                last_id = items[-1].id
+        self.stdout.write(f"Indexed {count} items")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from backend.models import ValueUsage
+
+
+class Command(BaseCommand):
+    help = "Recount how often each value is stored under each key, the counts are used to suggest values"
+
+    def handle(self, *args, **options):
+        ValueUsage.rebuild()
+        self.stdout.write(f"Counted {ValueUsage.objects.count()} values")
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-17 10:26
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    for model_name in ("Container", "Category", "ItemTemplate"):
+        Model = apps.get_model("backend", model_name)
+
+        children = defaultdict(list)
+        roots = []
+        for id_, parent_id in Model.objects.values_list("id", "parent_id"):
+            if id_ == parent_id:
+                roots.append(id_)
+            else:
+                children[parent_id].append(id_)
+
+        nodes = []
+        stack = [(id_, "") for id_ in roots]
+        while stack:
+            id_, parent_path = stack.pop()
+            path = f"{parent_path}{id_}/"
+            nodes.append(Model(id=id_, path=path))
+            stack.extend((child, path) for child in children[id_])
+        Model.objects.bulk_update(nodes, ("path",), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0002_create_roots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=4096),
+        ),
+        migrations.AddField(
+            model_name='container',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=4096),
+        ),
+        migrations.AddField(
+            model_name='itemtemplate',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=4096),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
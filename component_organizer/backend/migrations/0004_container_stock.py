@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-17 10:28
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def count_stock(apps, schema_editor):
+    Container = apps.get_model("backend", "Container")
+    ItemLocation = apps.get_model("backend", "ItemLocation")
+
+    direct = dict(ItemLocation.objects.values_list("parent_id").annotate(Sum("amount")).order_by())
+    total = defaultdict(int)
+    containers = list(Container.objects.only("id", "path"))
+    for container in containers:
+        amount = direct.get(container.id, 0)
+        for ancestor in container.path.split("/"):
+            if ancestor:
+                total[int(ancestor)] += amount
+
+    for container in containers:
+        container.direct_amount = direct.get(container.id, 0)
+        container.total_amount = total[container.id]
+    Container.objects.bulk_update(containers, ("direct_amount", "total_amount"), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0003_tree_paths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='container',
+            name='direct_amount',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='container',
+            name='total_amount',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_stock, migrations.RunPython.noop),
+    ]
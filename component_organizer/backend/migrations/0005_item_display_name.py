@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-17 10:31
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+class _MissingFields(dict):
+    def __missing__(self, key):
+        return "?"
+
+
+def render_names(apps, schema_editor):
+    Item = apps.get_model("backend", "Item")
+    KeyValuePair = apps.get_model("backend", "KeyValuePair")
+    ContentType = apps.get_model("contenttypes", "ContentType")
+
+    value_strings = {
+        "stringvalue": lambda ids: apps.get_model("backend", "StringValue").objects.filter(id__in=ids)
+                                                                          .values_list("id", "value"),
+        "filevalue": lambda ids: apps.get_model("backend", "FileValue").objects.filter(id__in=ids)
+                                                                      .values_list("id", "value"),
+        "floatvalue": lambda ids: ((id_, str(value)) for id_, value in apps.get_model("backend", "FloatValue")
+                                   .objects.filter(id__in=ids).values_list("id", "value")),
+        "unitvalue": lambda ids: ((id_, f"{number} {unit}") for id_, number, unit in apps.get_model("backend", "UnitValue")
+                                  .objects.filter(id__in=ids).values_list("id", "number__value", "unit__value")),
+    }
+    content_types = dict(ContentType.objects.filter(app_label="backend").values_list("id", "model"))
+
+    items = list(Item.objects.select_related("template"))
+    for start in range(0, len(items), 500):
+        batch = items[start:start + 500]
+        pairs = list(KeyValuePair.objects.filter(owner__in=batch)
+                                         .values_list("owner_id", "key__value", "value_type_id", "value_id"))
+        ids = defaultdict(set)
+        for _, _, type_id, value_id in pairs:
+            ids[content_types.get(type_id)].add(value_id)
+        strings = {}
+        for model, model_ids in ids.items():
+            if model in value_strings:
+                strings.update(((model, id_), string) for id_, string in value_strings[model](model_ids))
+
+        fields = defaultdict(dict)
+        for owner_id, key, type_id, value_id in pairs:
+            fields[owner_id][key] = strings.get((content_types.get(type_id), value_id), "")
+
+        for item in batch:
+            try:
+                name = item.template.name_format.format_map(_MissingFields(fields[item.id]))
+            except (ValueError, TypeError, IndexError, AttributeError):
+                name = item.template.name_format
+            item.display_name = name[:255]
+        Item.objects.bulk_update(batch, ("display_name",))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0004_container_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='display_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(render_names, migrations.RunPython.noop),
+    ]
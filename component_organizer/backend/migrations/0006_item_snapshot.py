@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0005_item_display_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='snapshot',
+            field=models.JSONField(default=None, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-17 10:34
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, schema_editor):
+    UnitValue = apps.get_model("backend", "UnitValue")
+    KeyValuePair = apps.get_model("backend", "KeyValuePair")
+    Item = apps.get_model("backend", "Item")
+    ContentType = apps.get_model("contenttypes", "ContentType")
+
+    content_type = ContentType.objects.filter(app_label="backend", model="unitvalue").first()
+    duplicates = UnitValue.objects.values("number_id", "unit_id") \
+                                  .annotate(count=Count("id"), keep=Min("id")).filter(count__gt=1)
+    for duplicate in duplicates:
+        ids = list(UnitValue.objects.filter(number_id=duplicate["number_id"], unit_id=duplicate["unit_id"])
+                                    .exclude(id=duplicate["keep"]).values_list("id", flat=True))
+        if content_type is not None:
+            pairs = KeyValuePair.objects.filter(value_type=content_type, value_id__in=ids)
+            # The snapshots reference the removed ids, so fall back to the pairs until they are rebuilt
+            Item.objects.filter(id__in=pairs.values("owner_id")).update(snapshot=None)
+            pairs.update(value_id=duplicate["keep"])
+        UnitValue.objects.filter(id__in=ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0006_item_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='unitvalue',
+            constraint=models.UniqueConstraint(fields=('number', 'unit'), name='unique_unit_value'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-17 10:35
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicates(apps, schema_editor):
+    KeyValuePair = apps.get_model("backend", "KeyValuePair")
+    Item = apps.get_model("backend", "Item")
+
+    duplicates = KeyValuePair.objects.values("owner_id", "key_id") \
+                                     .annotate(count=Count("id"), keep=Max("id")).filter(count__gt=1)
+    for duplicate in duplicates:
+        KeyValuePair.objects.filter(owner_id=duplicate["owner_id"], key_id=duplicate["key_id"]) \
+                            .exclude(id=duplicate["keep"]).delete()
+        # The snapshot might have been built from one of the removed pairs
+        Item.objects.filter(id=duplicate["owner_id"]).update(snapshot=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0007_unique_unit_value'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='keyvaluepair',
+            index=models.Index(fields=['key', 'value_type', 'value_id'], name='kvp_key_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='keyvaluepair',
+            index=models.Index(fields=['value_type', 'value_id'], name='kvp_value_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='keyvaluepair',
+            constraint=models.UniqueConstraint(fields=('owner', 'key'), name='unique_owner_key'),
+        ),
+    ]
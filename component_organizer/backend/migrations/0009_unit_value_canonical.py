@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-17 10:42
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+# Frozen copy of the unit conversion this migration was written with, see backend.helper for the current one
+SI_PREFIXES = {"p": -12, "n": -9, "u": -6, "\u00B5": -6, "\u03BC": -6, "m": -3, "k": 3, "M": 6, "G": 9}
+UNPREFIXED_UNITS = {"mol", "min", "mil", "mph", "mmHg", "ppm", "ppb", "kat", "kn", "kt", "Gy", "Mx"}
+
+
+def canonicalize_unit(number, unit):
+    unit = unit.strip()
+    exponent, base_unit = 0, unit
+    if len(unit) > 1 and unit[0] in SI_PREFIXES and unit not in UNPREFIXED_UNITS:
+        exponent, base_unit = SI_PREFIXES[unit[0]], unit[1:]
+    number = float(number)
+    if exponent:
+        number = float(Decimal(repr(number)).scaleb(exponent))
+    return number, base_unit
+
+
+def set_canonical(apps, schema_editor):
+    UnitValue = apps.get_model("backend", "UnitValue")
+
+    values = list(UnitValue.objects.select_related("number", "unit"))
+    for value in values:
+        value.canonical, value.base_unit = canonicalize_unit(value.number.value, value.unit.value)
+    UnitValue.objects.bulk_update(values, ("canonical", "base_unit"), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0008_pair_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unitvalue',
+            name='base_unit',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='unitvalue',
+            name='canonical',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(set_canonical, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='unitvalue',
+            index=models.Index(fields=['base_unit', 'canonical'], name='unit_value_canonical_idx'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.30 on 2026-10-17 10:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_pairs(apps, schema_editor):
+    KeyValuePair = apps.get_model("backend", "KeyValuePair")
+    TypedPair = apps.get_model("backend", "TypedPair")
+    value_models = {
+        "stringvalue": (apps.get_model("backend", "StringValue"), "string"),
+        "floatvalue": (apps.get_model("backend", "FloatValue"), "number"),
+        "unitvalue": (apps.get_model("backend", "UnitValue"), "unit"),
+        "filevalue": (apps.get_model("backend", "FileValue"), "file"),
+    }
+
+    last_id = 0
+    while True:
+        pairs = list(KeyValuePair.objects.filter(id__gt=last_id).order_by("id")
+                                 .values_list("id", "owner_id", "key__value", "value_type__model", "value_id")[:1000])
+        if not pairs:
+            break
+        last_id = pairs[-1][0]
+
+        # Fetch the referenced values with one query per model
+        values = {}
+        for model_name, (ValueModel, _) in value_models.items():
+            ids = [value_id for _, _, _, value_type, value_id in pairs if value_type == model_name]
+            queryset = ValueModel.objects.filter(id__in=ids)
+            if model_name == "unitvalue":
+                queryset = queryset.select_related("number", "unit")
+            values.update(((model_name, value.id), value) for value in queryset)
+
+        typed_pairs = []
+        for _, owner_id, key, value_type, value_id in pairs:
+            value = values.get((value_type, value_id))
+            if value is None:
+                continue
+            typed_pair = TypedPair(owner_id=owner_id, key=key, value_type=value_models[value_type][1])
+            if value_type == "stringvalue":
+                typed_pair.value_str = value.value
+            elif value_type == "floatvalue":
+                typed_pair.value_float = value.value
+            elif value_type == "unitvalue":
+                typed_pair.value_float = value.number.value
+                typed_pair.value_str = value.unit.value
+                # Computed by 0009 with the same rules
+                typed_pair.unit_canonical, typed_pair.base_unit = value.canonical, value.base_unit
+            else:
+                typed_pair.file_path = value.value.name
+            typed_pairs.append(typed_pair)
+        TypedPair.objects.bulk_create(typed_pairs)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0009_unit_value_canonical'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TypedPair',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('value_type', models.CharField(max_length=16)),
+                ('value_str', models.CharField(default=None, max_length=255, null=True)),
+                ('value_float', models.FloatField(default=None, null=True)),
+                ('unit_canonical', models.FloatField(default=None, null=True)),
+                ('base_unit', models.CharField(default=None, max_length=255, null=True)),
+                ('file_path', models.CharField(default=None, max_length=255, null=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='typed_pairs', to='backend.item')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key', 'value_type', 'value_str'], name='typed_pair_str_idx'), models.Index(fields=['key', 'value_type', 'value_float'], name='typed_pair_float_idx'), models.Index(fields=['key', 'base_unit', 'unit_canonical'], name='typed_pair_unit_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='typedpair',
+            constraint=models.UniqueConstraint(fields=('owner', 'key'), name='unique_typed_owner_key'),
+        ),
+        migrations.RunPython(copy_pairs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-17 10:52
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_key_types(apps, schema_editor):
+    KeyValuePair = apps.get_model("backend", "KeyValuePair")
+    KeyTypeUsage = apps.get_model("backend", "KeyTypeUsage")
+    api_names = {"stringvalue": "string", "floatvalue": "number", "unitvalue": "unit", "filevalue": "file"}
+
+    KeyTypeUsage.objects.bulk_create(
+        (KeyTypeUsage(key=key, value_type=api_names[model], uses=uses)
+         for key, model, uses in KeyValuePair.objects.values_list("key__value", "value_type__model")
+                                                     .annotate(uses=Count("id")).order_by()
+         if model in api_names),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0010_typed_pair'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KeyTypeUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('value_type', models.CharField(max_length=16)),
+                ('uses', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='keytypeusage',
+            constraint=models.UniqueConstraint(fields=('key', 'value_type'), name='unique_key_type_usage'),
+        ),
+        migrations.RunPython(count_key_types, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    Item = apps.get_model("backend", "Item")
+    schema_editor.execute("CREATE VIRTUAL TABLE backend_itemsearch USING fts5"
+                          "(name, template, fields, tokenize = 'unicode61 remove_diacritics 2')")
+
+    # Items without a snapshot are indexed without their fields, rebuild_search_index adds them
+    last_id = -1
+    while True:
+        items = list(Item.objects.filter(id__gt=last_id).order_by("id")
+                                 .values_list("id", "display_name", "template__name_format", "snapshot")[:1000])
+        if not items:
+            break
+        last_id = items[-1][0]
+
+        rows = []
+        for id_, display_name, name_format, snapshot in items:
+            fields = []
+            for key, (api_name, _, number, text, _, _) in (snapshot or {}).items():
+                if api_name == "number":
+                    fields.append(f"{key} {number}")
+                elif api_name == "unit":
+                    fields.append(f"{key} {number} {text}")
+                else:
+                    fields.append(f"{key} {text}")
+            rows.append((id_, display_name, name_format, "\n".join(fields)))
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany("INSERT INTO backend_itemsearch (rowid, name, template, fields) "
+                               "VALUES (%s, %s, %s, %s)", rows)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE backend_itemsearch")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0011_key_type_usage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
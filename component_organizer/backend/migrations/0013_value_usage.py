@@ -0,0 +1,74 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:01
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_values(apps, schema_editor):
+    KeyValuePair = apps.get_model("backend", "KeyValuePair")
+    ValueUsage = apps.get_model("backend", "ValueUsage")
+    value_models = {
+        "stringvalue": (apps.get_model("backend", "StringValue"), "string"),
+        "floatvalue": (apps.get_model("backend", "FloatValue"), "number"),
+        "unitvalue": (apps.get_model("backend", "UnitValue"), "unit"),
+        "filevalue": (apps.get_model("backend", "FileValue"), "file"),
+    }
+
+    for model_name, (ValueModel, api_name) in value_models.items():
+        counts = list(KeyValuePair.objects.filter(value_type__model=model_name)
+                                  .values_list("key__value", "value_id").annotate(uses=Count("id")).order_by())
+        queryset = ValueModel.objects.filter(id__in=set(value_id for _, value_id, _ in counts))
+        if model_name == "unitvalue":
+            queryset = queryset.select_related("number", "unit")
+        values = dict((value.id, value) for value in queryset.iterator())
+
+        usages = []
+        for key, value_id, uses in counts:
+            value = values.get(value_id)
+            if value is None:
+                continue
+            usage = ValueUsage(key=key, value_type=api_name, uses=uses)
+            if model_name == "stringvalue":
+                usage.value = usage.value_str = value.value
+            elif model_name == "floatvalue":
+                usage.value_float = value.value
+                usage.value = str(value.value)
+            elif model_name == "unitvalue":
+                usage.value_float = value.number.value
+                usage.value_str = value.unit.value
+                usage.value = f"{value.number.value} {value.unit.value}"[:255]
+            else:
+                usage.value = usage.file_path = value.value.name
+            usages.append(usage)
+        ValueUsage.objects.bulk_create(usages, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0012_item_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValueUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('value_type', models.CharField(max_length=16)),
+                ('value', models.CharField(max_length=255)),
+                ('value_str', models.CharField(default=None, max_length=255, null=True)),
+                ('value_float', models.FloatField(default=None, null=True)),
+                ('file_path', models.CharField(default=None, max_length=255, null=True)),
+                ('uses', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key', 'uses'], name='value_usage_key_uses_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='valueusage',
+            constraint=models.UniqueConstraint(fields=('key', 'value_type', 'value'), name='unique_value_usage'),
+        ),
+        migrations.RunPython(count_values, migrations.RunPython.noop),
+    ]
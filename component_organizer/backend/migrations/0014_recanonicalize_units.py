@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+from django.db import migrations
+
+# Frozen copy of the unit conversion this migration was written with, see backend.helper for the current one
+SI_PREFIXES = {"p": -12, "n": -9, "u": -6, "\u00B5": -6, "\u03BC": -6, "m": -3, "k": 3, "M": 6, "G": 9}
+PREFIXABLE_UNITS = {
+    "\u2126", "\u03A9",
+    "V", "A", "W", "F", "H", "Hz", "s", "S", "g", "m", "l", "L", "J", "C", "T", "Wb", "N", "Pa", "K",
+    "Wh", "Ah", "VA", "var", "eV", "bar", "B", "b", "cd", "lm", "lx",
+}
+
+
+def canonicalize_unit(number, unit):
+    unit = unit.strip()
+    exponent, base_unit = 0, unit
+    if len(unit) > 1 and unit[0] in SI_PREFIXES and unit[1:] in PREFIXABLE_UNITS:
+        exponent, base_unit = SI_PREFIXES[unit[0]], unit[1:]
+    number = float(number)
+    if exponent:
+        number = float(Decimal(repr(number)).scaleb(exponent))
+    return number, base_unit
+
+
+def recanonicalize(apps, schema_editor):
+    UnitValue = apps.get_model("backend", "UnitValue")
+    TypedPair = apps.get_model("backend", "TypedPair")
+
+    # Only rows whose unit isn't split anymore, like "m/s", change
+    values = []
+    for value in UnitValue.objects.select_related("number", "unit").iterator():
+        canonical, base_unit = canonicalize_unit(value.number.value, value.unit.value)
+        if (canonical, base_unit) != (value.canonical, value.base_unit):
+            value.canonical, value.base_unit = canonical, base_unit
+            values.append(value)
+    UnitValue.objects.bulk_update(values, ("canonical", "base_unit"), batch_size=500)
+
+    pairs = []
+    for pair in TypedPair.objects.filter(value_type="unit").iterator():
+        canonical, base_unit = canonicalize_unit(pair.value_float, pair.value_str)
+        if (canonical, base_unit) != (pair.unit_canonical, pair.base_unit):
+            pair.unit_canonical, pair.base_unit = canonical, base_unit
+            pairs.append(pair)
+    TypedPair.objects.bulk_update(pairs, ("unit_canonical", "base_unit"), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0013_value_usage'),
+    ]
+
+    operations = [
+        migrations.RunPython(recanonicalize, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def index_template_names(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    # 0012 indexed the templates' name formats instead of their names
+    schema_editor.execute("UPDATE backend_itemsearch SET template = "
+                          "(SELECT backend_itemtemplate.name FROM backend_item "
+                          "JOIN backend_itemtemplate ON backend_itemtemplate.id = backend_item.template_id "
+                          "WHERE backend_item.id = backend_itemsearch.rowid)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0014_recanonicalize_units'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_template_names, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,16 @@
 from collections import defaultdict
-from functools import reduce
+from typing import Optional
 
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import models, connection, transaction
+from django.db.models.functions import Concat, Substr
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver, Signal
 from django.core.validators import MinValueValidator
 
-from backend.models.dict import Dict, StringValue
+from backend import search
+from backend.helper import get_version, bump_version
+from backend.models.dict import Dict, StringValue, KeyTypeUsage, ValueUsage
 
 
 class _TreeNode(models.Model):
@@ -14,9 +19,12 @@ class _TreeNode(models.Model):
 
     name = models.CharField(default="", max_length=255)
     parent = models.ForeignKey("self", on_delete=models.CASCADE, default=0, related_name="children_manager")
+    path = models.CharField(max_length=4096, default="", db_index=True, editable=False)
+    """Materialized path of ancestor ids including the node's own id (for example `0/4/17/`)"""
 
-    PARENT_QUERY_DEPTH = 63  # How many parents to query at once (max 63 because django)
-                             # See obj_path
+    PATH_SEPARATOR = "/"
+    MAINTAINED_FIELDS = ("path",)
+    """Fields which are kept up to date by the database and must not be overwritten by stale instances"""
 
     def get_absolute_url(self) -> str:
         """
@@ -42,6 +50,16 @@ class _TreeNode(models.Model):
         """
         return self.parent_id == self.id
 
+    @property
+    def path_ids(self) -> list[int]:
+        """
+        Return the ids of all nodes along the absolute path (root first)
+
+        :return: ids from the root down to this node
+        :rtype: list of int
+        """
+        return [int(id_) for id_ in self._get_path().split(self.PATH_SEPARATOR) if id_]
+
     @property
     def obj_path(self) -> list["_TreeNode"]:
         """
@@ -50,54 +68,193 @@ class _TreeNode(models.Model):
         :return: absolute path to container
         :rtype: list of objects
         """
-        parent_lookup = ["__".join("parent" for _ in range(i)) for i in range(1, self.PARENT_QUERY_DEPTH+1)]
-        path = []
-        container = self.__class__.objects.select_related(*parent_lookup).get(id=self.id)
-        for _ in range(self.PARENT_QUERY_DEPTH-1):
-            path.insert(0, container)
-            if container.is_root:
-                break
-            else:
-                container = container.parent
+        ids = self.path_ids
+        nodes = self.__class__.objects.in_bulk(ids)
+        return [nodes[id_] for id_ in ids]
+
+    @property
+    def descendants(self) -> models.QuerySet:
+        """
+        Return a queryset of all nodes below this one (at any depth)
+
+        :return: queryset of descendants excluding this node
+        :rtype: QuerySet
+        """
+        return self.__class__.objects.filter(**self._subtree_lookup(self._get_path())).exclude(id=self.id)
+
+    @classmethod
+    def _subtree_lookup(cls, path: str) -> dict:
+        """
+        Build a filter for all paths starting with a path
+
+        A range is used instead of `startswith`, because SQLite can't use the index for a LIKE with ESCAPE.
+        Every path ends with the separator, so all paths below `0/4/` are at least `0/4/` and less than `0/40`.
+
+        :param path: materialized path of the subtree's root
+        :type path: str
+        :return: keyword arguments for `filter`
+        :rtype: dict
+        """
+        return {"path__gte": path, "path__lt": path[:-1] + chr(ord(cls.PATH_SEPARATOR) + 1)}
+
+    def _get_path(self) -> str:
+        """
+        Return the materialized path, querying it if this instance wasn't loaded from the database.
+
+        :return: materialized path
+        :rtype: str
+        """
+        if not self.path:
+            self.path = self.__class__.objects.values_list("path", flat=True).get(id=self.id)
+        return self.path
+
+    def _build_path(self) -> str:
+        """
+        Construct this node's path from its parent's stored path.
+
+        :return: materialized path
+        :rtype: str
+        """
+        if self.is_root:
+            parent_path = ""
         else:
-            path = container.obj_path + path
-        return path
+            parent_path = self.__class__.objects.values_list("path", flat=True).get(id=self.parent_id)
+        return f"{parent_path}{self.id}{self.PATH_SEPARATOR}"
+
+    def save(self, *args, **kwargs):
+        """
+        Save the node and keep the materialized paths of it and its subtree up to date
+        """
+        with transaction.atomic():
+            current = None
+            if self.id is not None:
+                current = self.__class__.objects.filter(id=self.id).values(*self.MAINTAINED_FIELDS).first()
+            if current is None:
+                for field in self.MAINTAINED_FIELDS:
+                    setattr(self, field, self._meta.get_field(field).get_default())
+            else:
+                for field, value in current.items():
+                    setattr(self, field, value)
+            old_path = self.path
+            super().save(*args, **kwargs)
+
+            path = self._build_path()
+            if path != old_path:
+                self.__class__.objects.filter(id=self.id).update(path=path)
+                if old_path:
+                    # Reparent the whole subtree by swapping the old prefix with the new one
+                    self.__class__.objects.filter(**self._subtree_lookup(old_path)).exclude(id=self.id).update(
+                        path=Concat(models.Value(path), Substr("path", len(old_path) + 1),
+                                    output_field=models.CharField())
+                    )
+                self.path = path
+                if old_path:
+                    self._path_changed(old_path, path)
+
+    def _path_changed(self, old_path: str, new_path: str):
+        """
+        Hook called after this node has been moved to another parent
+
+        :param old_path: materialized path before the move
+        :type old_path: str
+        :param new_path: materialized path after the move
+        :type new_path: str
+        """
+        pass
 
-    def get_children(self, depth: int = 1) -> list["_TreeNode"]:
+    def get_children(self, depth: Optional[int] = 1, limit: Optional[int] = None) -> list["_TreeNode"]:
         """
         Query all children up to a given depth and return list of immediate children.
         Those children have an extra attribute `children` which holds their children.
         This continues up to the specified depth.
-        :param depth: how many layers of children to query (default 1 for just direct children; max 64)
-        :type depth: int
+
+        The subtree is retrieved in a single recursive query, see `query_subtrees`.
+        :param depth: how many layers of children to query (default 1 for just direct children; None for unlimited)
+        :type depth: int or None
+        :param limit: maximum number of nodes to query (default None for unlimited)
+        :type limit: int or None
         :return: list of direct children with extra children attribute
         :rtype: list of objects
         """
-        if not 0 < depth < 65:
-            raise ValueError("depth must be between 1 and 64 (inclusive)")
+        self.query_subtrees([self], depth, limit)
+        return self.children
 
-        qs = [
-            models.Q(**{"__".join("parent" for _ in range(i)): self})
-            for i in range(1, depth+1)
-        ]
+    @classmethod
+    def query_subtrees(cls, parents: list["_TreeNode"], depth: Optional[int] = 1,
+                       limit: Optional[int] = None) -> dict[int, "_TreeNode"]:
+        """
+        Query the subtrees below several nodes in a single recursive query.
+
+        Every parent and queried node gets an extra attribute `children` with its queried children
+        and a `children_loaded` attribute which is False when their children might not all have been queried.
+        Queried nodes also get a `depth` (1 for direct children of a parent).
+
+        The nodes are retrieved breadth first, so when `limit` cuts them off, every node's parent is queried as well.
+        :param parents: nodes whose children to query
+        :type parents: list of objects
+        :param depth: how many layers of children to query (default 1 for just direct children; None for unlimited)
+        :type depth: int or None
+        :param limit: maximum number of nodes to query (default None for unlimited)
+        :type limit: int or None
+        :return: dict from id to queried node
+        :rtype: dict
+        """
+        if depth is not None and depth < 1:
+            raise ValueError("depth must be at least 1")
+        if limit is not None and limit < 0:
+            raise ValueError("limit must not be negative")
+
+        table = connection.ops.quote_name(cls._meta.db_table)
+        params = [parent.id for parent in parents]
+        parent_placeholders = ", ".join("%s" for _ in parents)
+        depth_condition = ""
+        if depth is not None:
+            depth_condition = "AND tree.depth < %s"
+            params.append(depth)
+        limit_clause = ""
+        if limit is not None:
+            limit_clause = "LIMIT %s"
+            params.append(limit)
 
         nodes = {}
-        for node in self.__class__.objects.filter(reduce(lambda x, y: x | y, qs)):
+        for node in cls.objects.raw(f"""
+            WITH RECURSIVE tree(id, depth) AS (
+                SELECT id, 1 FROM {table} WHERE parent_id IN ({parent_placeholders}) AND id != parent_id
+                UNION ALL
+                SELECT node.id, tree.depth + 1 FROM {table} AS node
+                JOIN tree ON node.parent_id = tree.id
+                WHERE node.id != node.parent_id {depth_condition}
+            )
+            SELECT node.*, tree.depth FROM {table} AS node JOIN tree ON node.id = tree.id
+            ORDER BY tree.depth, node.id
+            {limit_clause}
+        """, params):
             nodes[node.id] = node
             node.children = []
-
-        direct = []
+            node.children_loaded = depth is None or node.depth < depth
+
+        parents_loaded = True
+        if limit is not None and len(nodes) == limit:
+            # The last two layers might have been cut off, including the parents' children
+            deepest = max((node.depth for node in nodes.values()), default=0)
+            for node in nodes.values():
+                if node.depth >= deepest - 1:
+                    node.children_loaded = False
+            parents_loaded = deepest > 1
+
+        lookup = dict((parent.id, parent) for parent in parents)
+        for parent in parents:
+            parent.children = []
+            parent.children_loaded = parents_loaded
         for node in nodes.values():
-            if node.is_root:
-                continue
-            if node.parent_id == self.id:
-                direct.append(node)
-            if node.parent_id in nodes:
+            if node.parent_id in lookup:
+                node.parent = lookup[node.parent_id]
+                lookup[node.parent_id].children.append(node)
+            elif node.parent_id in nodes:
                 node.parent = nodes[node.parent_id]
                 nodes[node.parent_id].children.append(node)
 
-        self.children = direct
-        return direct
+        return nodes
 
     def __str__(self):
         if self.is_root:
@@ -107,7 +264,42 @@ class _TreeNode(models.Model):
 
 
 class Container(_TreeNode):
-    pass
+    direct_amount = models.IntegerField(default=0, editable=False)
+    """Number of items stored directly in this container"""
+    total_amount = models.IntegerField(default=0, editable=False)
+    """Number of items stored in this container and all of its descendants"""
+
+    MAINTAINED_FIELDS = _TreeNode.MAINTAINED_FIELDS + ("direct_amount", "total_amount")
+
+    @classmethod
+    def add_stock(cls, container_id: int, amount: int):
+        """
+        Add (or remove with a negative amount) stock to a container and all of its ancestors
+
+        :param container_id: container whose items changed
+        :type container_id: int
+        :param amount: how many items were added
+        :type amount: int
+        """
+        path = cls.objects.filter(id=container_id).values_list("path", flat=True).first()
+        if amount == 0 or path is None:
+            return
+        cls.objects.filter(id__in=cls(path=path).path_ids).update(
+            total_amount=models.F("total_amount") + amount,
+            direct_amount=models.Case(
+                models.When(id=container_id, then=models.F("direct_amount") + amount),
+                default=models.F("direct_amount"),
+            ),
+        )
+
+    def _path_changed(self, old_path, new_path):
+        old_ancestors = set(Container(path=old_path).path_ids)
+        new_ancestors = set(Container(path=new_path).path_ids)
+        if self.total_amount:
+            Container.objects.filter(id__in=old_ancestors - new_ancestors) \
+                             .update(total_amount=models.F("total_amount") - self.total_amount)
+            Container.objects.filter(id__in=new_ancestors - old_ancestors) \
+                             .update(total_amount=models.F("total_amount") + self.total_amount)
 
 
 class Category(_TreeNode):
@@ -118,15 +310,102 @@ class ItemTemplate(_TreeNode):
     name_format = models.CharField(max_length=255, default="", blank="")
     """To get an item's name, this string will be formatted with the item's variables"""
 
+    def save(self, *args, **kwargs):
+        """
+        Save the template and re-render its items' names if its name_format changed
+        or update their full text index if its name changed
+        """
+        old = None
+        if self.id is not None:
+            old = ItemTemplate.objects.filter(id=self.id).values_list("name_format", "name").first()
+        super().save(*args, **kwargs)
+        if old is not None and old[0] != self.name_format:
+            Item.render_names(Item.objects.filter(template=self))
+        if old is not None and old[1] != self.name:
+            search.rename_template(Item.objects.filter(template=self).values("id"), self.name)
+
+    _fields_cache: dict[int, tuple[list[int], dict[str, type]]] = {}
+    """Process local cache from template id to its path's ids and its resolved fields"""
+    _fields_version: Optional[str] = None
+    """Shared version (see `helper.get_version`) `_fields_cache` was filled at"""
+    FIELDS_VERSION_KEY = "template_fields_version"
+
+    @classmethod
+    def _check_fields_cache(cls):
+        """
+        Drop the cached fields when another process changed any template since they were cached
+        """
+        version = get_version(cls.FIELDS_VERSION_KEY)
+        if version != cls._fields_version:
+            cls._fields_cache.clear()
+            cls._fields_version = version
+
     def get_fields(self) -> dict[str, "_SingleValue"]:
         """
         Return a dict of field names to field types an item of this template must have.
+
+        The result is cached until this template or any of its ancestors or their fields change.
+        Changes made by other processes are noticed through a version in Django's cache.
+        """
+        self._check_fields_cache()
+        cached = self._fields_cache.get(self.id)
+        if cached is None:
+            path_ids = self.path_ids
+            depth = dict((id_, i) for i, id_ in enumerate(path_ids))
+            fields = {}
+            for _, key, value_type_id in sorted(
+                ItemTemplateField.objects.filter(template_id__in=path_ids)
+                                         .values_list("template_id", "key__value", "value_type_id"),
+                key=lambda field: depth[field[0]],
+            ):
+                fields[key] = ContentType.objects.get_for_id(value_type_id).model_class()
+            cached = (path_ids, fields)
+            self._fields_cache[self.id] = cached
+        return dict(cached[1])
+
+    @classmethod
+    def resolve_all_fields(cls, templates: list["ItemTemplate"]) -> dict[int, tuple[dict[str, type], list[str]]]:
+        """
+        Resolve the fields of a whole template forest at once.
+
+        All `ItemTemplateField`s are retrieved in a single query and inherited top-down in memory.
+        The results are stored in the same cache `get_fields` uses.
+
+        :param templates: templates to resolve, which have to include all their ancestors
+        :type templates: list of ItemTemplate
+        :return: dict from template id to its resolved fields and the keys of its own fields
+        :rtype: dict of (dict, list)-tuples
+        """
+        cls._check_fields_cache()
+        own_fields = defaultdict(dict)
+        for template_id, key, value_type_id in ItemTemplateField.objects \
+                .filter(template__in=templates).values_list("template_id", "key__value", "value_type_id"):
+            own_fields[template_id][key] = ContentType.objects.get_for_id(value_type_id).model_class()
+
+        result = {}
+        for template in sorted(templates, key=lambda t: len(t.path_ids)):
+            if template.is_root:
+                fields = {}
+            else:
+                fields = dict(result[template.parent_id][0])
+            fields.update(own_fields[template.id])
+            result[template.id] = (fields, list(own_fields[template.id]))
+            cls._fields_cache[template.id] = (template.path_ids, fields)
+        return dict((id_, (dict(fields), own)) for id_, (fields, own) in result.items())
+
+    @classmethod
+    def invalidate_fields(cls, template_id: int):
         """
-        fields = {}
-        for obj in self.obj_path:
-            for field in ItemTemplateField.objects.filter(template=obj).select_related("key", "value_type"):
-                fields[field.key.value] = field.value_type.model_class()
-        return fields
+        Drop the cached fields of a template and all of its descendants in this process
+        and make the other processes drop all of theirs
+
+        :param template_id: template whose fields changed
+        :type template_id: int
+        """
+        for id_, (path_ids, _) in list(cls._fields_cache.items()):
+            if template_id in path_ids:
+                cls._fields_cache.pop(id_, None)
+        bump_version(cls.FIELDS_VERSION_KEY)
 
 
 class ItemTemplateField(models.Model):
@@ -138,6 +417,16 @@ class ItemTemplateField(models.Model):
         return f"{self.template}.{self.key.value}: {self.value_type.model_class().api_name}"
 
 
+@receiver((post_save, post_delete), sender=ItemTemplate)
+def _invalidate_template(sender, instance: ItemTemplate, **kwargs):
+    ItemTemplate.invalidate_fields(instance.id)
+
+
+@receiver((post_save, post_delete), sender=ItemTemplateField)
+def _invalidate_template_field(sender, instance: ItemTemplateField, **kwargs):
+    ItemTemplate.invalidate_fields(instance.template_id)
+
+
 class ItemLocation(models.Model):
     parent = models.ForeignKey("backend.Container", on_delete=models.CASCADE)
     amount = models.PositiveIntegerField(validators=[MinValueValidator(1)], default=1)
@@ -146,10 +435,47 @@ class ItemLocation(models.Model):
     def __str__(self):
         return f"{self.amount}x{self.item} in {self.parent}"
 
+    def save(self, *args, **kwargs):
+        """
+        Save the location and update the stock of the affected containers
+        """
+        with transaction.atomic():
+            old = None
+            if self.id is not None:
+                old = ItemLocation.objects.filter(id=self.id).values_list("parent_id", "amount").first()
+            super().save(*args, **kwargs)
+
+            if old is None:
+                Container.add_stock(self.parent_id, self.amount)
+            elif old[0] == self.parent_id:
+                Container.add_stock(self.parent_id, self.amount - old[1])
+            else:
+                Container.add_stock(old[0], -old[1])
+                Container.add_stock(self.parent_id, self.amount)
+
+
+@receiver(pre_delete, sender=ItemLocation)
+def _remove_stock(sender, instance: ItemLocation, **kwargs):
+    # pre_delete because a cascade from Container might delete the container first
+    Container.add_stock(instance.parent_id, -instance.amount)
+
+
+class _MissingFields(dict):
+    """Format mapping which renders fields an item doesn't have as `?`"""
+
+    def __missing__(self, key):
+        return "?"
+
+
+items_changed = Signal()
+"""Sent by Item after any item was created, changed or deleted, for example to invalidate cached query results"""
+
 
 class Item(Dict):
     category = models.ForeignKey(Category, default=0, on_delete=models.CASCADE)
     template = models.ForeignKey(ItemTemplate, default=0, on_delete=models.CASCADE)
+    display_name = models.CharField(max_length=255, default="", db_index=True, editable=False)
+    """The template's name_format rendered with this item's fields"""
 
     def get_absolute_url(self):
         return f"/item/{self.id}"
@@ -158,8 +484,75 @@ class Item(Dict):
     def url(self):
         return self.get_absolute_url()
 
-    def __str__(self):
+    def render_name(self) -> str:
+        """
+        Format the template's name_format with this item's fields
+
+        :return: the item's name
+        :rtype: str
+        """
         if self._data is None:
-            self.populate()
+            if self.id is None:
+                self._data = {}
+            else:
+                self.populate()
+
+        try:
+            name = self.template.name_format.format_map(_MissingFields(self._data))
+        except (ValueError, TypeError, IndexError, AttributeError):
+            name = self.template.name_format
+        return name[:self._meta.get_field("display_name").max_length]
+
+    @classmethod
+    def render_names(cls, queryset: models.QuerySet, batch_size: int = 500):
+        """
+        Re-render and store the names of a whole queryset of items
+
+        :param queryset: items whose names to update
+        :type queryset: QuerySet of Item
+        :param batch_size: how many items to populate at once
+        :type batch_size: int
+        """
+        last_id = -1
+        while True:
+            items = cls.populate_queryset(queryset.filter(id__gt=last_id).order_by("id")[:batch_size])
+            if not items:
+                break
+            for item in items:
+                item.display_name = item.render_name()
+            cls.objects.bulk_update(items, ("display_name",))
+            search.index_items(items)
+            items_changed.send(sender=cls)
+            last_id = items[-1].id
+
+    def save(self, *args, **kwargs):
+        self.display_name = self.render_name()
+        super().save(*args, **kwargs)
+        search.index_items([self])
+        items_changed.send(sender=self.__class__)
+
+    def _pairs_changed(self):
+        super()._pairs_changed()
+        search.index_items([self])
+        items_changed.send(sender=self.__class__)
+
+    def _derived_fields(self):
+        return dict(super()._derived_fields(), display_name=self.render_name())
+
+    def __str__(self):
+        return self.display_name
+
+
+@receiver(pre_delete, sender=Item)
+def _remove_usages(sender, instance: Item, **kwargs):
+    changes = defaultdict(int)
+    for key, value in instance.items():
+        changes[(key, value.api_name)] -= 1
+    KeyTypeUsage.record(changes)
+    ValueUsage.record((key, value, -1) for key, value in instance.items())
+
 
-        return self.template.name_format.format(**self._data)
+@receiver(post_delete, sender=Item)
+def _item_deleted(sender, instance: Item, **kwargs):
+    search.remove_items([instance.id])
+    items_changed.send(sender=sender)
@@ -1,10 +1,31 @@
+import math
+import operator
 import re
-from typing import Iterable, Any
-
-from django.db import models
+from collections import defaultdict
+from decimal import Decimal
+from functools import reduce
+from typing import Iterable, Any, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models, transaction
+from django.db.models import F, Value, Subquery, OuterRef, Count, Exists, Window
+from django.db.models.functions import Abs, Coalesce, RowNumber
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 
+from backend.helper import LRUCache, canonicalize_unit, parse_percentage, get_version, bump_version
+
+
+BULK_CHUNK_SIZE = 500
+"""How many values to look up in a single query"""
+
+_value_cache = LRUCache(getattr(settings, "VALUE_CACHE_SIZE", 10000))
+"""Process local cache from (api_name, value) to the row `_from_row` expects"""
+_value_cache_version = None
+"""Shared version (see `helper.get_version`) `_value_cache` was filled at"""
+VALUE_CACHE_VERSION_KEY = "value_cache_version"
+
 
 # ------------ #
 # Value models #
@@ -17,6 +38,14 @@ class _SingleValue(models.Model):
     value: models.Field = NotImplemented
     value_in_pairs = GenericRelation("KeyValuePair", object_id_field="value_id", content_type_field="value_type")
     _content_type: ContentType = None
+    interned: bool = True
+    """Whether instances are cached by value, which requires values to be unique"""
+    ordered: bool = False
+    """Whether the type supports nearest and tolerance lookups, which requires a numeric lookup column"""
+    lookup_column: str = "value"
+    """Indexed column of this model lookups compare with"""
+    typed_column: str = "value_str"
+    """Indexed column of `TypedPair` lookups compare with"""
 
     _comparison_operators = {
         "=": "",
@@ -32,6 +61,21 @@ class _SingleValue(models.Model):
     def __str__(self):
         return str(self.value)
 
+    def sort_key(self) -> tuple:
+        """
+        Key to sort values of different models by
+
+        Numbers and units (by their canonical value) are sorted numerically before strings and files,
+        like `PairStorage.sort_columns` does.
+
+        :return: (0 for ordered models else 1, number, text)
+        :rtype: tuple
+        """
+        if self.ordered:
+            return 0, getattr(self, self.lookup_column), str(self)
+        else:
+            return 1, 0, str(self)
+
     @classmethod
     def convert(cls, string: str):
         """
@@ -39,7 +83,7 @@ class _SingleValue(models.Model):
 
         :param string: an input string to parse
         :type string: str
-        :return: A parsed value, _parse_lookup, get, bulk_get can work with
+        :return: A parsed value, lookups, get, bulk_get can work with
         :rtype: whatever this Model is for
         :raises ValueError: when the string can't be converted
         """
@@ -55,27 +99,106 @@ class _SingleValue(models.Model):
         :return: Model instance storing the requested value
         :rtype: instance of this Model
         """
-        obj, _ = cls.objects.get_or_create(value=value)
-        return obj
+        return cls.bulk_get([value])[value]
 
     @classmethod
-    def bulk_get(cls, values: list) -> dict:
+    def bulk_get(cls, values: Iterable) -> dict:
         """
         A more efficient alternative to get when requesting multiple values at once.
 
+        Values are looked up in a process local cache first.
+        Then existing values are selected, missing ones are inserted ignoring conflicts with concurrent writers
+        (`INSERT ... ON CONFLICT DO NOTHING`) and then selected again.
+
         :param values: List of values to get
         :type values: list
         :return: dict from argument value to Model instance
         :rtype: dict
         """
-        result = dict((key, None) for key in values)
+        values = set(values)
+        result = cls._cached_values(values)
+
+        missing = values.difference(result)
+        if missing:
+            found = cls._select_values(missing)
+            created = missing.difference(found)
+            if created:
+                cls.objects.bulk_create((cls(value=value) for value in created), ignore_conflicts=True)
+                found.update(cls._select_values(created))
+            cls._intern_values(found)
+            result.update(found)
+
+        return result
+
+    @classmethod
+    def _cached_values(cls, values: set) -> dict:
+        """
+        Look up values in the process local cache
+
+        :param values: values to look up
+        :type values: set
+        :return: dict from value to Model instance for all cached values
+        :rtype: dict
+        """
+        result = {}
+        if cls.interned:
+            cls._check_cache()
+            for value in values:
+                row = _value_cache.get((cls.api_name, value))
+                if row is not None:
+                    result[value] = cls._from_row(*row)
+        return result
+
+    @classmethod
+    def _intern_values(cls, objects: dict):
+        """
+        Add values to the process local cache once the current transaction commits
+
+        Values of a transaction which is rolled back are never cached.
+
+        :param objects: dict from value to Model instance
+        :type objects: dict
+        """
+        if cls.interned and objects:
+            entries = dict(((cls.api_name, value), obj._to_row()) for value, obj in objects.items())
+            transaction.on_commit(lambda: _value_cache.update(entries))
+
+    @staticmethod
+    def _check_cache():
+        """
+        Drop the cached values when another process deleted values since they were cached
+        """
+        global _value_cache_version
+        version = get_version(VALUE_CACHE_VERSION_KEY)
+        if version != _value_cache_version:
+            _value_cache.clear()
+            _value_cache_version = version
+
+    @staticmethod
+    def clear_cache():
+        """
+        Forget all cached values in every process, for example after deleting values
 
-        for value in cls.objects.filter(value__in=values):
-            result[value.value] = value
+        Other processes notice it through a version in Django's cache once the current transaction commits.
+        """
+        _value_cache.clear()
+        bump_version(VALUE_CACHE_VERSION_KEY)
 
-        for value in cls.objects.bulk_create(cls(value=key) for key, value in result.items() if value is None):
-            result[value.value] = value
+    @classmethod
+    def _select_values(cls, values: set) -> dict:
+        """
+        Select existing instances for a set of values
 
+        :param values: values to select
+        :type values: set
+        :return: dict from value to Model instance
+        :rtype: dict
+        """
+        result = {}
+        values = list(values)
+        for i in range(0, len(values), BULK_CHUNK_SIZE):
+            for obj in cls.objects.filter(value__in=values[i:i + BULK_CHUNK_SIZE]):
+                result[obj.value] = obj
         return result
 
     @classmethod
@@ -90,37 +213,124 @@ class _SingleValue(models.Model):
         return cls._content_type
 
     @classmethod
-    def _populate_queryset(cls, owners: list) -> Iterable:
+    def _populate_queryset(cls, owners: list) -> models.QuerySet:
         """
         Retrieve all values of this class for a list of Dicts
 
+        All value models return the same columns (see `_populate_columns`),
+        so their querysets can be combined into a single UNION ALL.
+
         :param owners: Dicts to populate
         :type owners: list of Dict
-        :return: Adjusted queryset of Dict as primary key, key as string and value as Model instance
-        :rtype: generator of (owner: int, key: str, value: _SingleValue) tuples
+        :return: Queryset of Dict's primary key, key as string, api_name and the columns `_from_row` expects
+        :rtype: values_list queryset
         """
-        return (
-            (owner, key, cls(id=id_, value=value))
-            for owner, key, id_, value in cls.objects.filter(value_in_pairs__owner__in=owners)
-            .values_list("value_in_pairs__owner_id", "value_in_pairs__key__value", "id", "value")
+        columns = dict(
+            pair_owner=F("value_in_pairs__owner_id"),
+            pair_key=F("value_in_pairs__key__value"),
+            pair_type=models.Value(cls.api_name),
         )
+        columns.update(cls._row_columns())
+        return cls.objects.filter(value_in_pairs__owner__in=owners) \
+                          .annotate(**columns).values_list(*columns)
 
     @classmethod
-    def _parse_lookup(cls, key: str, op: str, value: Any) -> models.QuerySet:
+    def _row_columns(cls) -> dict:
         """
-        Create a queryset to lookup items which have a key and matching value
+        Select the columns `_from_row` expects
+
+        :return: dict from `pair_id`, `pair_number`, `pair_text`, `pair_number_id` and `pair_unit_id` to expressions
+        :rtype: dict
+        """
+        columns = dict(
+            pair_id=F("id"),
+            pair_number=models.Value(None, output_field=models.FloatField()),
+            pair_text=models.Value(None, output_field=models.CharField()),
+            pair_number_id=models.Value(None, output_field=models.BigIntegerField()),
+            pair_unit_id=models.Value(None, output_field=models.BigIntegerField()),
+        )
+        columns.update(cls._populate_columns())
+        return columns
+
+    @classmethod
+    def _select_ids(cls, ids: list) -> dict:
+        """
+        Select instances by their ids without a query per related value
+
+        :param ids: ids to select
+        :type ids: list of int
+        :return: dict from id to Model instance
+        :rtype: dict
+        """
+        result = {}
+        columns = cls._row_columns()
+        for i in range(0, len(ids), BULK_CHUNK_SIZE):
+            for row in cls.objects.filter(id__in=ids[i:i + BULK_CHUNK_SIZE]) \
+                                  .annotate(**columns).values_list(*columns):
+                result[row[0]] = cls._from_row(*row)
+        return result
+
+    @classmethod
+    def _populate_columns(cls) -> dict:
+        """
+        Select the columns storing this model's value
+
+        :return: dict from `pair_number`, `pair_text`, `pair_number_id` or `pair_unit_id` to expressions
+        :rtype: dict
+        """
+        return {"pair_text": F("value")}
+
+    @classmethod
+    def _from_row(cls, id_: int, number: float, text: str, number_id: int, unit_id: int) -> "_SingleValue":
+        """
+        Construct an instance from the columns returned by `_populate_queryset`
+
+        :return: Model instance
+        :rtype: instance of this Model
+        """
+        return cls(id=id_, value=text)
+
+    def _to_row(self) -> list:
+        """
+        The inverse of `_from_row`
+
+        :return: id, number, text, number_id and unit_id
+        :rtype: list
+        """
+        return [self.id, None, str(self.value), None, None]
+
+    @classmethod
+    def _comparable(cls, value: Any) -> Tuple[dict, Any]:
+        """
+        Split a value into filters selecting comparable values and the value to compare the lookup column with
 
-        :param key: key whose value to lookup
-        :type key: str
-        :param op: lookup operator to use
-        :type op: str
         :param value: value to compare with
         :type value: whatever this Model is for
-        :return: A queryset of matching Items' ids
-        :rtype: queryset of Item ids
+        :return: (filters, value)
+        :rtype: tuple of dict and whatever the lookup column stores
+        """
+        return {}, value
+
+    def _typed_columns(self) -> dict:
         """
-        return cls.objects.filter(value_in_pairs__key__value=key, **{f"value{cls._comparison_operators[op]}": value}) \
-                          .values_list("value_in_pairs__owner_id")
+        Select the `TypedPair` columns storing this value
+
+        :return: dict from `value_str`, `value_float`, `unit_canonical`, `base_unit` or `file_path` to values
+        :rtype: dict
+        """
+        return {"value_str": str(self.value)}
+
+    @classmethod
+    def _from_typed(cls, value_str: str, value_float: float, file_path: str) -> "_SingleValue":
+        """
+        The inverse of `_typed_columns`
+
+        The instance isn't saved, since values stored in `TypedPair` don't reference the value tables.
+
+        :return: Model instance
+        :rtype: instance of this Model
+        """
+        return cls(value=value_str)
 
 
 class StringValue(_SingleValue):
@@ -131,22 +341,66 @@ class StringValue(_SingleValue):
 class FileValue(_SingleValue):
     api_name = "file"
     value = models.FileField(max_length=255)
+    interned = False
+    typed_column = "file_path"
+
+    def _typed_columns(self):
+        return {"file_path": self.value.name}
+
+    @classmethod
+    def _from_typed(cls, value_str, value_float, file_path):
+        return cls(value=file_path)
 
 
 class FloatValue(_SingleValue):
     api_name = "number"
     example_value = 0
     value = models.FloatField(default=0, unique=True)
+    ordered = True
+    typed_column = "value_float"
 
     @classmethod
     def convert(cls, string: str):
         return float(string)
 
+    @classmethod
+    def _populate_columns(cls):
+        return {"pair_number": F("value")}
+
+    @classmethod
+    def _from_row(cls, id_, number, text, number_id, unit_id):
+        return cls(id=id_, value=number)
+
+    def _to_row(self):
+        return [self.id, self.value, None, None, None]
+
+    def _typed_columns(self):
+        return {"value_float": self.value}
+
+    @classmethod
+    def _from_typed(cls, value_str, value_float, file_path):
+        return cls(value=value_float)
+
 
 class UnitValue(_SingleValue):
     api_name = "unit"
     number = models.ForeignKey(FloatValue, on_delete=models.CASCADE)
     unit = models.ForeignKey(StringValue, on_delete=models.CASCADE)
+    # The number converted to the unit without SI prefix, for example 4700 and "Ω" for 4.7 kΩ
+    base_unit = models.CharField(max_length=255, default="", editable=False)
+    canonical = models.FloatField(default=0, editable=False)
+    ordered = True
+    lookup_column = "canonical"
+    typed_column = "unit_canonical"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=("number", "unit"), name="unique_unit_value"),
+        ]
+        indexes = [
+            models.Index(fields=("base_unit", "canonical"), name="unit_value_canonical_idx"),
+        ]
+
     _pattern = re.compile(r"^([+-]?(?:\d*\.\d+|\d+)(?:e[+-]?\d+)?) *(.+)$")
 
     @property
@@ -168,42 +422,100 @@ class UnitValue(_SingleValue):
         else:
             raise ValueError(f"{repr(string)} doesn't match regex")
 
-    @classmethod
-    def get(cls, value):
-        obj, _ = cls.objects.get_or_create(
-            number=FloatValue.get(value[0]),
-            unit=StringValue.get(value[1])
-        )
-        return obj
+    def set_canonical(self):
+        """
+        Set canonical and base_unit from number and unit
+        """
+        self.canonical, self.base_unit = canonicalize_unit(self.number.value, self.unit.value)
+
+    def save(self, *args, **kwargs):
+        self.set_canonical()
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {"canonical", "base_unit", *kwargs["update_fields"]}
+        super().save(*args, **kwargs)
 
     @classmethod
     def bulk_get(cls, values: Iterable) -> dict:
-        numbers = FloatValue.bulk_get([number for number, _ in values])
-        units = StringValue.bulk_get([unit for _, unit in values])
-        objects = {}
-        for number, unit in values:
-            # TODO find better solution than single get_or_creates
-            obj, _ = cls.objects.get_or_create(
-                number=numbers[number],
-                unit=units[unit],
-            )
-            objects[(number, unit)] = obj
-        return objects
+        values = set(values)
+        result = cls._cached_values(values)
+
+        missing = values.difference(result)
+        if missing:
+            numbers = FloatValue.bulk_get(number for number, _ in missing)
+            units = StringValue.bulk_get(unit for _, unit in missing)
+            pairs = dict(((numbers[number].id, units[unit].id), (number, unit)) for number, unit in missing)
+
+            found = cls._select_pairs(pairs, numbers, units)
+            created = missing.difference(found)
+            if created:
+                objects = [cls(number=numbers[number], unit=units[unit]) for number, unit in created]
+                for obj in objects:
+                    obj.set_canonical()
+                cls.objects.bulk_create(objects, ignore_conflicts=True)
+                found.update(cls._select_pairs(
+                    dict((ids, value) for ids, value in pairs.items() if value in created), numbers, units
+                ))
+            cls._intern_values(found)
+            result.update(found)
+
+        return result
 
     @classmethod
-    def _populate_queryset(cls, owners):
-        return (
-            (owner, key, cls(id=id_, number=FloatValue(id=number_id, value=number_value), unit=StringValue(id=unit_id, value=unit_value)))
-            for owner, key, id_, number_id, number_value, unit_id, unit_value in cls.objects.filter(value_in_pairs__owner__in=owners)
-            .values_list("value_in_pairs__owner_id", "value_in_pairs__key__value", "id", "number_id", "number__value", "unit_id", "unit__value")
-        )
+    def _select_pairs(cls, pairs: dict, numbers: dict, units: dict) -> dict:
+        """
+        Select existing instances for (number, unit) tuples
+
+        :param pairs: dict from (number_id, unit_id) to (number, unit)
+        :type pairs: dict
+        :param numbers: dict from number to FloatValue
+        :type numbers: dict
+        :param units: dict from unit to StringValue
+        :type units: dict
+        :return: dict from (number, unit) to Model instance
+        :rtype: dict
+        """
+        result = {}
+        number_ids = list(set(number_id for number_id, _ in pairs))
+        unit_ids = list(set(unit_id for _, unit_id in pairs))
+        for i in range(0, len(number_ids), BULK_CHUNK_SIZE):
+            for id_, number_id, unit_id, canonical, base_unit in \
+                    cls.objects.filter(number_id__in=number_ids[i:i + BULK_CHUNK_SIZE], unit_id__in=unit_ids) \
+                               .values_list("id", "number_id", "unit_id", "canonical", "base_unit"):
+                if (number_id, unit_id) in pairs:
+                    number, unit = pairs[(number_id, unit_id)]
+                    result[(number, unit)] = cls(id=id_, number=numbers[number], unit=units[unit],
+                                                 canonical=canonical, base_unit=base_unit)
+        return result
+
+    @classmethod
+    def _populate_columns(cls):
+        return {"pair_number": F("number__value"), "pair_text": F("unit__value"),
+                "pair_number_id": F("number_id"), "pair_unit_id": F("unit_id")}
+
+    @classmethod
+    def _from_row(cls, id_, number, text, number_id, unit_id):
+        obj = cls(id=id_, number=FloatValue(id=number_id, value=number), unit=StringValue(id=unit_id, value=text))
+        obj.set_canonical()
+        return obj
+
+    def _to_row(self):
+        return [self.id, self.number.value, self.unit.value, self.number_id, self.unit_id]
 
     @classmethod
-    def _parse_lookup(cls, key, op, value):
-        number, unit = value
-        value_lookup = {"number__value" + cls._comparison_operators[op]: number}
-        return cls.objects.filter(value_in_pairs__key__value=key, unit__value=unit, **value_lookup) \
-                          .values_list("value_in_pairs__owner_id")
+    def _comparable(cls, value):
+        canonical, base_unit = canonicalize_unit(*value)
+        return {"base_unit": base_unit}, canonical
+
+    def _typed_columns(self):
+        canonical, base_unit = canonicalize_unit(self.number.value, self.unit.value)
+        return {"value_float": self.number.value, "value_str": self.unit.value,
+                "unit_canonical": canonical, "base_unit": base_unit}
+
+    @classmethod
+    def _from_typed(cls, value_str, value_float, file_path):
+        obj = cls(number=FloatValue(value=value_float), unit=StringValue(value=value_str))
+        obj.set_canonical()
+        return obj
 
 
 # ---------- #
@@ -216,10 +528,663 @@ class KeyValuePair(models.Model):
     value_id = models.PositiveIntegerField()
     value_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            # Also serves Dict's (owner, key) lookups
+            models.UniqueConstraint(fields=("owner", "key"), name="unique_owner_key"),
+        ]
+        indexes = [
+            # Lookups of a key's values and counting a key's uses
+            models.Index(fields=("key", "value_type", "value_id"), name="kvp_key_value_idx"),
+            # Joins from the value models and checking whether a value is used
+            models.Index(fields=("value_type", "value_id"), name="kvp_value_idx"),
+        ]
+
     def __str__(self):
         return f"dict_{self.owner_id}.{self.key} = {self.value}"
 
 
+class TypedPair(models.Model):
+    """
+    Key-value pair storing its value in typed columns instead of referencing a value model (see `TypedPairStorage`)
+    """
+    owner = models.ForeignKey("backend.Item", on_delete=models.CASCADE, related_name="typed_pairs")
+    key = models.CharField(max_length=255)
+    value_type = models.CharField(max_length=16)
+    """The value model's api_name"""
+    value_str = models.CharField(max_length=255, null=True, default=None)
+    value_float = models.FloatField(null=True, default=None)
+    unit_canonical = models.FloatField(null=True, default=None)
+    base_unit = models.CharField(max_length=255, null=True, default=None)
+    file_path = models.CharField(max_length=255, null=True, default=None)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=("owner", "key"), name="unique_typed_owner_key"),
+        ]
+        indexes = [
+            models.Index(fields=("key", "value_type", "value_str"), name="typed_pair_str_idx"),
+            models.Index(fields=("key", "value_type", "value_float"), name="typed_pair_float_idx"),
+            models.Index(fields=("key", "base_unit", "unit_canonical"), name="typed_pair_unit_idx"),
+        ]
+
+    def __str__(self):
+        return f"dict_{self.owner_id}.{self.key} = {self.value_type}"
+
+
+class KeyTypeUsage(models.Model):
+    """
+    How many pairs store a value of a type under a key, used to skip impossible value types when filtering
+
+    Rows are kept when their count drops to 0, so a new row always means a key was used with a new type.
+    New rows bump the shared version `VERSION_KEY` (see `helper.get_version`).
+    """
+    key = models.CharField(max_length=255)
+    value_type = models.CharField(max_length=16)
+    """The value model's api_name"""
+    uses = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=("key", "value_type"), name="unique_key_type_usage"),
+        ]
+
+    VERSION_KEY = "key_types_version"
+
+    def __str__(self):
+        return f"{self.key}: {self.value_type} ({self.uses})"
+
+    @classmethod
+    def record(cls, changes: dict):
+        """
+        Add to the counts using one insert for new combinations and one update
+
+        :param changes: dict from (key, api_name) to the difference in uses
+        :type changes: dict
+        """
+        changes = dict((key_type, delta) for key_type, delta in changes.items() if delta)
+        if not changes:
+            return
+        added = set(key_type for key_type, delta in changes.items() if delta > 0)
+        if added:
+            added -= set(cls.objects.filter(key__in=set(key for key, _ in added)).values_list("key", "value_type"))
+        if added:
+            cls.objects.bulk_create((cls(key=key, value_type=value_type) for key, value_type in added),
+                                    ignore_conflicts=True)
+            bump_version(cls.VERSION_KEY)
+        cls.objects.filter(reduce(operator.or_, (models.Q(key=key, value_type=value_type)
+                                                 for key, value_type in changes))) \
+                   .update(uses=models.Case(*(models.When(key=key, value_type=value_type, then=F("uses") + delta)
+                                              for (key, value_type), delta in changes.items()),
+                                            default=F("uses")))
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls):
+        """
+        Recount all pairs in the storage engine selected by the DICT_STORAGE setting
+        """
+        cls.objects.all().delete()
+        cls.objects.bulk_create((cls(key=key, value_type=value_type, uses=uses)
+                                 for key, value_type, uses in get_storage().count_key_types()),
+                                batch_size=BULK_CHUNK_SIZE)
+        bump_version(cls.VERSION_KEY)
+
+
+class ValueUsage(models.Model):
+    """
+    How many pairs store a value under a key, used to suggest values without counting the pairs
+
+    Values are identified by their string representation and rebuilt from the columns `_from_typed` expects.
+    """
+    key = models.CharField(max_length=255)
+    value_type = models.CharField(max_length=16)
+    """The value model's api_name"""
+    value = models.CharField(max_length=255)
+    """The value's string representation"""
+    value_str = models.CharField(max_length=255, null=True, default=None)
+    value_float = models.FloatField(null=True, default=None)
+    file_path = models.CharField(max_length=255, null=True, default=None)
+    uses = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=("key", "value_type", "value"), name="unique_value_usage"),
+        ]
+        indexes = [
+            models.Index(fields=("key", "uses"), name="value_usage_key_uses_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.key} = {self.value} ({self.uses})"
+
+    @classmethod
+    def from_value(cls, key: str, value: _SingleValue, uses: int = 0) -> "ValueUsage":
+        """
+        Create an unsaved row for a value
+
+        :param key: key the value is stored under
+        :type key: str
+        :param value: value to count
+        :type value: _SingleValue
+        :param uses: initial count
+        :type uses: int
+        :return: unsaved instance
+        :rtype: ValueUsage
+        """
+        columns = value._typed_columns()
+        return cls(key=key, value_type=value.api_name, value=str(value)[:255], uses=uses,
+                   value_str=columns.get("value_str"), value_float=columns.get("value_float"),
+                   file_path=columns.get("file_path"))
+
+    def to_value(self, value_models: dict) -> _SingleValue:
+        """
+        Rebuild the counted value
+
+        :param value_models: dict from api_name to value model
+        :type value_models: dict
+        :return: unsaved value model instance with a `uses` attribute
+        :rtype: _SingleValue
+        """
+        value = value_models[self.value_type]._from_typed(self.value_str, self.value_float, self.file_path)
+        value.uses = self.uses
+        return value
+
+    @classmethod
+    def record(cls, changes: Iterable):
+        """
+        Add to the counts using one insert for new values, one update and one delete for unused values
+
+        :param changes: (key, value, difference in uses) tuples
+        :type changes: iterable
+        """
+        deltas = defaultdict(int)
+        rows = {}
+        for key, value, delta in changes:
+            row = cls.from_value(key, value)
+            identity = (row.key, row.value_type, row.value)
+            deltas[identity] += delta
+            rows[identity] = row
+        deltas = dict((identity, delta) for identity, delta in deltas.items() if delta)
+        if not deltas:
+            return
+        cls.objects.bulk_create((rows[identity] for identity, delta in deltas.items() if delta > 0),
+                                ignore_conflicts=True)
+        changed = cls.objects.filter(reduce(operator.or_, (models.Q(key=key, value_type=value_type, value=value)
+                                                           for key, value_type, value in deltas)))
+        changed.update(uses=models.Case(*(models.When(key=key, value_type=value_type, value=value,
+                                                      then=F("uses") + delta)
+                                          for (key, value_type, value), delta in deltas.items()),
+                                        default=F("uses")))
+        if any(delta < 0 for delta in deltas.values()):
+            changed.filter(uses__lte=0).delete()
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls):
+        """
+        Recount all pairs in the storage engine selected by the DICT_STORAGE setting
+        """
+        cls.objects.all().delete()
+        cls.objects.bulk_create((cls.from_value(key, value, uses)
+                                 for key, value, uses in get_storage().count_values(Dict.iter_value_models())),
+                                batch_size=BULK_CHUNK_SIZE)
+
+
+# --------------- #
+# Storage engines #
+# --------------- #
+class _WindowSum(models.Func):
+    """
+    SUM as window function, which unlike `Sum` can be applied to an aggregate
+    """
+    function = "SUM"
+    window_compatible = True
+
+
+class PairStorage:
+    """
+    Table a Dict's key-value pairs are stored in, select one with the DICT_STORAGE setting (see `get_storage`)
+    """
+
+    owner_field: str = NotImplemented
+    """Field of the querysets returned by `_candidates` holding the owner's id"""
+
+    def query_pairs(self, value_models: list, owners: list) -> Iterable:
+        """
+        Retrieve the key-value pairs of several objects
+
+        :param value_models: value models which might be stored
+        :type value_models: list of subclasses of _SingleValue
+        :param owners: objects to retrieve pairs for
+        :type owners: list of Dict
+        :return: (owner: int, key: str, value: _SingleValue) tuples
+        :rtype: generator
+        """
+        raise NotImplementedError
+
+    def write(self, owner: "Dict", sets: dict, deletes: Iterable[str] = (), clear: bool = False):
+        """
+        Write changes to an object's key-value pairs
+
+        :param owner: object whose pairs to change
+        :type owner: Dict
+        :param sets: A mapping from strings to SingleValues to set
+        :type sets: dict
+        :param deletes: keys to delete
+        :type deletes: iterable of str
+        :param clear: whether to delete all existing pairs first
+        :type clear: bool
+        """
+        raise NotImplementedError
+
+    def count_key_types(self) -> Iterable:
+        """
+        Count the pairs per key and value type
+
+        :return: (key, api_name, count) tuples
+        :rtype: iterable
+        """
+        raise NotImplementedError
+
+    def count_values(self, value_models: list) -> Iterable:
+        """
+        Count the pairs per key and value
+
+        :param value_models: value models which might be stored
+        :type value_models: list of subclasses of _SingleValue
+        :return: (key, value, count) tuples
+        :rtype: iterable
+        """
+        raise NotImplementedError
+
+    def facets(self, value_models: list, owners: models.QuerySet, limit: int) -> Iterable:
+        """
+        Count how many of some objects have each key and each of the key's most common values
+
+        :param value_models: value models which might be stored
+        :type value_models: list of subclasses of _SingleValue
+        :param owners: objects whose pairs to count
+        :type owners: QuerySet
+        :param limit: how many values to return per key
+        :type limit: int
+        :return: (key, key_uses, value, uses) tuples, at most limit per key
+        :rtype: iterable
+        """
+        raise NotImplementedError
+
+    def _facet_columns(self, value_models: list) -> dict:
+        """
+        Create expressions for a pair's value to order a key's equally used values by
+
+        :param value_models: value models which might be stored
+        :type value_models: list of subclasses of _SingleValue
+        :return: dict with "sort_number" for numbers and units (by their canonical value) and "sort_text"
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _count_facets(pairs: models.QuerySet, key_field: str, value_fields: tuple, sort_columns: dict,
+                      limit: int) -> models.QuerySet:
+        """
+        Group pairs by key and value in a single query keeping each key's most used values
+
+        An object has at most one pair per key, so the pairs per key are the sum of the pairs per value.
+        Equally used values are kept in the order of their numbers first and texts second (see `_facet_columns`).
+
+        :param pairs: pairs to count
+        :type pairs: QuerySet
+        :param key_field: field holding the key
+        :type key_field: str
+        :param value_fields: fields identifying the value
+        :type value_fields: tuple of str
+        :param sort_columns: "sort_number" and "sort_text" expressions returned by `_facet_columns`
+        :type sort_columns: dict
+        :param limit: how many values to keep per key
+        :type limit: int
+        :return: dicts of the key and value fields, `key_uses` and `uses`
+        :rtype: values QuerySet
+        """
+        # The windows are annotated after grouping, otherwise they would become part of the GROUP BY
+        # The sort columns depend on the value only, so grouping by them doesn't split any group
+        uses = Count("id")
+        return pairs.annotate(**sort_columns).values(key_field, *value_fields, *sort_columns) \
+            .annotate(uses=uses).annotate(
+                key_uses=Window(_WindowSum(uses), partition_by=F(key_field)),
+                rank=Window(RowNumber(), partition_by=F(key_field),
+                            order_by=(uses.desc(), F("sort_number").asc(nulls_last=True), F("sort_text").asc(),
+                                      *(F(field).asc() for field in value_fields))),
+            ).filter(rank__lte=limit).order_by()
+
+    def _column(self, ValueModel) -> str:
+        """
+        Get the column lookups of a value model compare with
+
+        :param ValueModel: value model to compare
+        :type ValueModel: subclass of _SingleValue
+        :return: name of a field of the querysets returned by `_candidates`
+        :rtype: str
+        """
+        raise NotImplementedError
+
+    def _candidates(self, ValueModel, key: str, filters: dict) -> models.QuerySet:
+        """
+        Query the values of a type stored under a key
+
+        :param ValueModel: value model to query
+        :type ValueModel: subclass of _SingleValue
+        :param key: key whose values to query
+        :type key: str
+        :param filters: additional filters, which have to be applied in the same call to refer to the same pair
+        :type filters: dict
+        :return: queryset of values or pairs
+        :rtype: QuerySet
+        """
+        raise NotImplementedError
+
+    def _owned(self, ValueModel, key: str, filters: dict) -> models.QuerySet:
+        """
+        Like `_candidates` but restricted to the pair of the item referenced by the outer query
+        """
+        return self._candidates(ValueModel, key, {**filters, self.owner_field: OuterRef("pk")})
+
+    def lookup(self, ValueModel, key: str, op: str, value: Any) -> Exists:
+        """
+        Create a predicate matching items which have a key and matching value
+
+        :param ValueModel: value model the value belongs to
+        :type ValueModel: subclass of _SingleValue
+        :param key: key whose value to lookup
+        :type key: str
+        :param op: lookup operator to use
+        :type op: str
+        :param value: value to compare with
+        :type value: whatever the ValueModel is for
+        :return: correlated EXISTS predicate to filter Items with
+        :rtype: Exists
+        """
+        filters, value = ValueModel._comparable(value)
+        column = self._column(ValueModel)
+        return Exists(self._owned(ValueModel, key, {
+            **filters, f"{column}{ValueModel._comparison_operators[op]}": value
+        }))
+
+    def nearest(self, ValueModel, key: str, value: Any) -> Exists:
+        """
+        Create a predicate matching items whose value for a key can be compared with a given one
+
+        The closest values aren't selected here, because that would ignore the query's other lookups.
+        Instead the items are ordered by `distance`, so a page's first items are the closest matching ones.
+
+        :param ValueModel: value model the value belongs to
+        :type ValueModel: subclass of _SingleValue
+        :param key: key whose value to lookup
+        :type key: str
+        :param value: value to compare with
+        :type value: whatever the ValueModel is for
+        :return: correlated EXISTS predicate to filter Items with
+        :rtype: Exists
+        :raises ValueError: when the ValueModel has no order
+        """
+        if not ValueModel.ordered:
+            raise ValueError(f"{ValueModel.__name__} has no order")
+        filters, _ = ValueModel._comparable(value)
+        return Exists(self._owned(ValueModel, key, filters))
+
+    def window(self, ValueModel, key: str, value: Any, tolerance: str) -> Exists:
+        """
+        Create a predicate matching items whose value for a key is within a tolerance of a given one
+
+        :param ValueModel: value model the value belongs to
+        :type ValueModel: subclass of _SingleValue
+        :param key: key whose value to lookup
+        :type key: str
+        :param value: value to compare with
+        :type value: whatever the ValueModel is for
+        :param tolerance: either a percentage like "10%" or a value which the ValueModel's `convert` accepts
+        :type tolerance: str
+        :return: correlated EXISTS predicate to filter Items with
+        :rtype: Exists
+        :raises ValueError: when the ValueModel has no order, the tolerance doesn't fit the value or isn't finite
+        """
+        if not ValueModel.ordered:
+            raise ValueError(f"{ValueModel.__name__} has no order")
+        filters, target = ValueModel._comparable(value)
+        if tolerance.endswith("%"):
+            delta = abs(Decimal(repr(target)) * parse_percentage(tolerance) / 100)
+        else:
+            tolerance_filters, tolerance = ValueModel._comparable(ValueModel.convert(tolerance))
+            if tolerance_filters != filters:
+                raise ValueError("The tolerance's unit doesn't match the value's")
+            delta = abs(Decimal(repr(tolerance)))
+        bounds = float(Decimal(repr(target)) - delta), float(Decimal(repr(target)) + delta)
+        if not all(map(math.isfinite, bounds)):
+            raise ValueError("The value and tolerance have to be finite")
+        column = self._column(ValueModel)
+        return Exists(self._owned(ValueModel, key, {
+            **filters,
+            f"{column}__gte": bounds[0],
+            f"{column}__lte": bounds[1],
+        }))
+
+    def distance(self, ValueModel, key: str, value: Any) -> Subquery:
+        """
+        Create an expression for the distance between an item's value for a key and a given one
+
+        :param ValueModel: value model the value belongs to
+        :type ValueModel: subclass of _SingleValue
+        :param key: key whose value to compare
+        :type key: str
+        :param value: value to compare with
+        :type value: whatever the ValueModel is for
+        :return: expression to annotate Items with
+        :rtype: Subquery
+        """
+        filters, target = ValueModel._comparable(value)
+        return Subquery(self._owned(ValueModel, key, filters)
+                            .annotate(distance=Abs(F(self._column(ValueModel)) - Value(target)))
+                            .values("distance")[:1])
+
+    def sort_columns(self, value_models: list, key: str) -> dict:
+        """
+        Create expressions for the value an item stores under a key to sort items by
+
+        Numbers and units (by their canonical value) are sorted before strings and files.
+
+        :param value_models: value models which might be stored under the key
+        :type value_models: list of subclasses of _SingleValue
+        :param key: key whose value to sort by
+        :type key: str
+        :return: dict with the correlated subqueries "sort_number" and "sort_text", if any model can provide them
+        :rtype: dict
+        """
+        columns = {}
+        for name, ordered, output_field in (("sort_number", True, models.FloatField()),
+                                            ("sort_text", False, models.CharField())):
+            subqueries = [Subquery(self._owned(ValueModel, key, {}).values(self._column(ValueModel))[:1],
+                                   output_field=output_field)
+                          for ValueModel in value_models if ValueModel.ordered == ordered]
+            if len(subqueries) > 1:
+                columns[name] = Coalesce(*subqueries, output_field=output_field)
+            elif subqueries:
+                columns[name] = subqueries[0]
+        return columns
+
+
+class GenericPairStorage(PairStorage):
+    """
+    Stores pairs in `KeyValuePair` which references the value models' tables
+    """
+
+    owner_field = "value_in_pairs__owner_id"
+
+    def query_pairs(self, value_models, owners):
+        # A single UNION ALL query over all value models
+        value_models = dict((ValueModel.api_name, ValueModel) for ValueModel in value_models)
+        query = reduce(lambda x, y: x.union(y, all=True),
+                       (ValueModel._populate_queryset(owners) for ValueModel in value_models.values()))
+        for owner_id, key, api_name, *columns in query.iterator():
+            yield owner_id, key, value_models[api_name]._from_row(*columns)
+
+    def write(self, owner, sets, deletes=(), clear=False):
+        # At most one delete, one bulk_update and one bulk_create
+        if clear:
+            KeyValuePair.objects.filter(owner=owner).delete()
+        elif deletes:
+            KeyValuePair.objects.filter(owner=owner, key__value__in=deletes).delete()
+
+        new_fields = dict(sets)
+        if sets and not clear:
+            existing_kvps = list(KeyValuePair.objects.filter(owner=owner, key__value__in=sets.keys())
+                                                     .select_related("key"))
+            for kvp in existing_kvps:
+                kvp.value = sets[kvp.key.value]
+                del new_fields[kvp.key.value]
+            KeyValuePair.objects.bulk_update(existing_kvps, ("value_type", "value_id"))
+
+        if new_fields:
+            new_kvps = []
+            keys = StringValue.bulk_get(new_fields.keys())
+            for key in new_fields:
+                new_kvps.append(KeyValuePair(owner=owner, value=new_fields[key], key=keys[key]))
+            KeyValuePair.objects.bulk_create(new_kvps)
+
+    def count_key_types(self):
+        for key, content_type_id, uses in KeyValuePair.objects.values_list("key__value", "value_type") \
+                                                               .annotate(uses=Count("id")).order_by():
+            yield key, ContentType.objects.get_for_id(content_type_id).model_class().api_name, uses
+
+    def count_values(self, value_models):
+        for ValueModel in value_models:
+            counts = list(KeyValuePair.objects.filter(value_type=ValueModel.content_type())
+                                              .values_list("key__value", "value_id").annotate(uses=Count("id"))
+                                              .order_by())
+            values = ValueModel._select_ids(list(set(value_id for _, value_id, _ in counts)))
+            for key, value_id, uses in counts:
+                if value_id in values:
+                    yield key, values[value_id], uses
+
+    def facets(self, value_models, owners, limit):
+        # Only the counted values are fetched afterwards
+        value_models = dict((ValueModel.content_type().id, ValueModel) for ValueModel in value_models)
+        counts = list(self._count_facets(KeyValuePair.objects.filter(owner__in=owners),
+                                         "key__value", ("value_type", "value_id"),
+                                         self._facet_columns(value_models.values()), limit))
+        values = {}
+        for content_type_id, ValueModel in value_models.items():
+            ids = [count["value_id"] for count in counts if count["value_type"] == content_type_id]
+            if ids:
+                values[content_type_id] = ValueModel._select_ids(ids)
+        for count in counts:
+            value = values.get(count["value_type"], {}).get(count["value_id"])
+            if value is not None:
+                yield count["key__value"], count["key_uses"], value, count["uses"]
+
+    def _facet_columns(self, value_models):
+        # Select the value's column from the pair's value model, the other models' cases are skipped
+        def case(columns, output_field):
+            return models.Case(*(models.When(value_type=ValueModel.content_type().id, then=Subquery(
+                ValueModel.objects.filter(id=OuterRef("value_id")).values(sort=column)[:1]
+            )) for ValueModel, column in columns), output_field=output_field)
+
+        value_models = list(value_models)
+        return {
+            "sort_number": case([(ValueModel, F(ValueModel.lookup_column))
+                                 for ValueModel in value_models if ValueModel.ordered], models.FloatField()),
+            "sort_text": case([(ValueModel, ValueModel._populate_columns()["pair_text"])
+                               for ValueModel in value_models if "pair_text" in ValueModel._populate_columns()],
+                              models.CharField()),
+        }
+
+    def _column(self, ValueModel):
+        return ValueModel.lookup_column
+
+    def _candidates(self, ValueModel, key, filters):
+        return ValueModel.objects.filter(value_in_pairs__key__value=key, **filters)
+
+
+class TypedPairStorage(PairStorage):
+    """
+    Stores pairs in `TypedPair` which doesn't need to join any value model's table
+    """
+
+    owner_field = "owner_id"
+
+    def query_pairs(self, value_models, owners):
+        value_models = dict((ValueModel.api_name, ValueModel) for ValueModel in value_models)
+        for owner_id, key, value_type, *columns in TypedPair.objects.filter(owner__in=owners) \
+                .values_list("owner_id", "key", "value_type", "value_str", "value_float", "file_path").iterator():
+            yield owner_id, key, value_models[value_type]._from_typed(*columns)
+
+    def write(self, owner, sets, deletes=(), clear=False):
+        # Replace the changed pairs using one delete and one bulk_create
+        if clear:
+            TypedPair.objects.filter(owner=owner).delete()
+        elif sets or deletes:
+            TypedPair.objects.filter(owner=owner, key__in=set(deletes).union(sets)).delete()
+
+        if sets:
+            TypedPair.objects.bulk_create(TypedPair(owner=owner, key=key, value_type=value.api_name,
+                                                    **value._typed_columns())
+                                          for key, value in sets.items())
+
+    def count_key_types(self):
+        return TypedPair.objects.values_list("key", "value_type").annotate(uses=Count("id")).order_by()
+
+    def count_values(self, value_models):
+        value_models = dict((ValueModel.api_name, ValueModel) for ValueModel in value_models)
+        for key, value_type, *columns, uses in TypedPair.objects \
+                .values_list("key", "value_type", "value_str", "value_float", "file_path") \
+                .annotate(uses=Count("id")).order_by().iterator():
+            if value_type in value_models:
+                yield key, value_models[value_type]._from_typed(*columns), uses
+
+    def facets(self, value_models, owners, limit):
+        value_models = dict((ValueModel.api_name, ValueModel) for ValueModel in value_models)
+        for count in self._count_facets(TypedPair.objects.filter(owner__in=owners), "key",
+                                        ("value_type", "value_str", "value_float", "file_path"),
+                                        self._facet_columns(value_models.values()), limit):
+            ValueModel = value_models.get(count["value_type"])
+            if ValueModel is not None:
+                value = ValueModel._from_typed(count["value_str"], count["value_float"], count["file_path"])
+                yield count["key"], count["key_uses"], value, count["uses"]
+
+    def _facet_columns(self, value_models):
+        # Units store their number in value_float as well, but are sorted by unit_canonical
+        return {
+            "sort_number": Coalesce("unit_canonical", "value_float"),
+            "sort_text": Coalesce("value_str", "file_path"),
+        }
+
+    def _column(self, ValueModel):
+        return ValueModel.typed_column
+
+    def _candidates(self, ValueModel, key, filters):
+        return TypedPair.objects.filter(key=key, value_type=ValueModel.api_name, **filters)
+
+
+_storages = {
+    "generic": GenericPairStorage(),
+    "typed": TypedPairStorage(),
+}
+
+
+def get_storage() -> PairStorage:
+    """
+    Get the storage engine selected by the DICT_STORAGE setting
+
+    :return: storage engine
+    :rtype: PairStorage
+    :raises ImproperlyConfigured: when the setting names an unknown engine
+    """
+    name = getattr(settings, "DICT_STORAGE", "generic")
+    try:
+        return _storages[name]
+    except KeyError:
+        raise ImproperlyConfigured(f"Unknown DICT_STORAGE {name!r}, choose one of {', '.join(_storages)}")
+
+
 # ---------- #
 # Dict model #
 # ---------- #
@@ -229,6 +1194,9 @@ class Dict(models.Model):
     Keys have to be strings and values can be any of string, integer or float.
     """
 
+    snapshot = models.JSONField(null=True, default=None, editable=False)
+    """Read optimized copy of all key-value pairs (see `_encode_snapshot`) or None if it hasn't been built yet"""
+
     @classmethod
     def iter_value_models(cls):
         return [FloatValue, StringValue, UnitValue, FileValue]
@@ -241,21 +1209,56 @@ class Dict(models.Model):
         self._data: dict = None
 
     @classmethod
-    def populate_queryset(cls, queryset):
+    def _query_pairs(cls, owners: list) -> Iterable:
+        """
+        Retrieve the key-value pairs of several objects from the storage engine
+
+        :param owners: objects to retrieve pairs for
+        :type owners: list of Dict
+        :return: (owner: int, key: str, value: _SingleValue) tuples
+        :rtype: generator
+        """
+        return get_storage().query_pairs(cls.iter_value_models(), owners)
+
+    @classmethod
+    def populate_queryset(cls, queryset, use_snapshots: bool = True):
         """
         Retrieve all key-value pairs for a whole queryset of objects
 
         This evaluates the queryset and returns a list of objects
+
+        :param queryset: objects to populate
+        :type queryset: QuerySet
+        :param use_snapshots: whether to decode existing snapshots instead of querying the key-value pairs
+        :type use_snapshots: bool
+        """
+        return cls.populate_objects(list(queryset.select_related("template")), use_snapshots)
+
+    @classmethod
+    def populate_objects(cls, objects: list, use_snapshots: bool = True):
+        """
+        Retrieve all key-value pairs for a list of already fetched objects
+
+        :param objects: objects to populate
+        :type objects: list
+        :param use_snapshots: whether to decode existing snapshots instead of querying the key-value pairs
+        :type use_snapshots: bool
+        :return: the objects
+        :rtype: list
         """
-        objects = []
         lookup = {}
-        for obj in queryset.select_related("template"):
-            objects.append(obj)
+        for obj in objects:
             lookup[obj.id] = obj
             obj._data = {}
 
-        for ValueModel in cls.iter_value_models():
-            for owner_id, key, value in ValueModel._populate_queryset(objects):
+        missing = []
+        for obj in objects:
+            if obj.snapshot is None or not use_snapshots:
+                missing.append(obj)
+            else:
+                obj._data = cls._decode_snapshot(obj.snapshot)
+        if missing:
+            for owner_id, key, value in cls._query_pairs(missing):
                 lookup[owner_id]._data[key] = value
 
         return objects
@@ -264,12 +1267,70 @@ class Dict(models.Model):
         """
         Retrieve all key-value pairs for a single object
         """
-        self._data = {}
+        if self.snapshot is not None:
+            self._data = self._decode_snapshot(self.snapshot)
+        else:
+            self._data = dict((key, value) for _, key, value in self._query_pairs([self]))
+
+    def _encode_snapshot(self) -> dict:
+        """
+        Encode the populated key-value pairs for the snapshot column
+
+        :return: dict from key to the value's api_name followed by its `_to_row`
+        :rtype: dict
+        """
+        return dict((key, [value.api_name, *value._to_row()]) for key, value in self._data.items())
 
-        for ValueModel in self.iter_value_models():
-            self._data.update(
-                (key, value) for _, key, value in ValueModel._populate_queryset([self])
-            )
+    @classmethod
+    def _decode_snapshot(cls, snapshot: dict) -> dict:
+        """
+        The inverse of `_encode_snapshot`
+
+        :param snapshot: content of the snapshot column
+        :type snapshot: dict
+        :return: dict from key to value model instance
+        :rtype: dict
+        """
+        value_models = dict((ValueModel.api_name, ValueModel) for ValueModel in cls.iter_value_models())
+        return dict((key, value_models[api_name]._from_row(*row)) for key, (api_name, *row) in snapshot.items())
+
+    @classmethod
+    def build_snapshots(cls, queryset: models.QuerySet, batch_size: int = 500) -> int:
+        """
+        (Re-)build the snapshots of a whole queryset from the key-value pairs
+
+        :param queryset: objects whose snapshot to build
+        :type queryset: QuerySet
+        :param batch_size: how many objects to populate at once
+        :type batch_size: int
+        :return: number of updated objects
+        :rtype: int
+        """
+        count = 0
+        last_id = -1
+        while True:
+            with transaction.atomic():
+                objects = cls.populate_queryset(queryset.filter(id__gt=last_id).order_by("id")[:batch_size],
+                                                use_snapshots=False)
+                if not objects:
+                    break
+                for obj in objects:
+                    obj.snapshot = obj._encode_snapshot()
+                cls.objects.bulk_update(objects, ("snapshot",))
+            count += len(objects)
+            last_id = objects[-1].id
+        return count
+
+    def save(self, *args, **kwargs):
+        """
+        Save the object without overwriting its snapshot which is only written when the pairs change
+        """
+        if self._state.adding and self.id is None and self.snapshot is None:
+            self.snapshot = {}  # A new object doesn't have any pairs yet
+        elif not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name != "snapshot"]
+        super().save(*args, **kwargs)
 
     def __getitem__(self, key: str) -> _SingleValue:
         if self._data is None:
@@ -281,17 +1342,7 @@ class Dict(models.Model):
             return self._data[key]
 
     def __setitem__(self, key: str, value: _SingleValue):
-        wrapped_value = {"value_id": value.id, "value_type": value.content_type()}
-
-        if self._data is None:
-            self.populate()
-
-        if key in self._data:
-            KeyValuePair.objects.filter(owner=self, key__value=key).update(**wrapped_value)
-        else:
-            KeyValuePair.objects.create(owner=self, key=StringValue.get(key), **wrapped_value)
-
-        self._data[key] = value
+        self._write({key: value})
 
     def __delitem__(self, key: str):
         if self._data is None:
@@ -300,8 +1351,7 @@ class Dict(models.Model):
         if key not in self._data:
             raise KeyError(key)
         else:
-            KeyValuePair.objects.filter(owner=self, key__value=key).delete()
-            del self._data[key]
+            self._write({}, {key})
 
     def update(self, data, **kwargs):
         """
@@ -310,27 +1360,85 @@ class Dict(models.Model):
         :param data: A mapping from strings to SingleValues
         :type data: anything convertable into a dict
         """
-        fields = dict(data, **kwargs)
+        self._write(dict(data, **kwargs))
 
-        existing_kvps = list(KeyValuePair.objects.filter(owner=self, key__value__in=fields.keys()).select_related("key"))
-        for kvp in existing_kvps:
-            kvp.value = fields[kvp.key.value]
-            del fields[kvp.key.value]
-        KeyValuePair.objects.bulk_update(existing_kvps, ("value_type", "value_id"))
+    def clear(self):
+        self._write({}, clear=True)
 
-        new_kvps = []
-        keys = StringValue.bulk_get(fields.keys())
-        for key in fields:
-            new_kvps.append(KeyValuePair(owner=self, value=fields[key], key=keys[key]))
-        KeyValuePair.objects.bulk_create(new_kvps)
+    def batch(self) -> "DictBatch":
+        """
+        Record several changes and write them at once when leaving the with block.
 
-        if self._data is not None:
-            self._data.update(fields)
+        Usage::
 
-    def clear(self):
-        KeyValuePair.objects.filter(owner=self).delete()
-        if self._data:
+            with item.batch() as fields:
+                fields.clear()
+                fields["foo"] = StringValue.get("bar")
+
+        When the with block raises an exception, the recorded changes are discarded.
+
+        :return: context manager yielding an object with this class' mutating methods
+        :rtype: DictBatch
+        """
+        return DictBatch(self)
+
+    @transaction.atomic
+    def _write(self, sets: dict, deletes: Iterable[str] = (), clear: bool = False):
+        """
+        Write changes to the key-value pairs through the storage engine in a single transaction.
+
+        The pairs are read again from the storage engine while the object's row is locked,
+        because the populated ones might be outdated by a write through another instance.
+        The snapshot, the search index and the usage counters are derived from these current pairs.
+
+        :param sets: A mapping from strings to SingleValues to set
+        :type sets: dict
+        :param deletes: keys to delete
+        :type deletes: iterable of str
+        :param clear: whether to delete all existing pairs first
+        :type clear: bool
+        """
+        self.__class__.objects.select_for_update().filter(id=self.id).values_list("id").first()
+        self._data = dict((key, value) for _, key, value in self._query_pairs([self]))
+
+        changes = defaultdict(int)
+        value_changes = []
+        for key in (self._data if clear else set(deletes).union(sets)):
+            if key in self._data:
+                changes[(key, self._data[key].api_name)] -= 1
+                value_changes.append((key, self._data[key], -1))
+        for key, value in sets.items():
+            changes[(key, value.api_name)] += 1
+            value_changes.append((key, value, 1))
+
+        get_storage().write(self, sets, deletes, clear)
+        KeyTypeUsage.record(changes)
+        ValueUsage.record(value_changes)
+
+        if clear:
             self._data.clear()
+        for key in deletes:
+            self._data.pop(key, None)
+        self._data.update(sets)
+        self._pairs_changed()
+
+    def _pairs_changed(self):
+        """
+        Called after any key-value pair has been set or deleted to update the columns derived from them
+        """
+        fields = self._derived_fields()
+        for field, value in fields.items():
+            setattr(self, field, value)
+        self.__class__.objects.filter(id=self.id).update(**fields)
+
+    def _derived_fields(self) -> dict:
+        """
+        Compute the columns derived from the populated key-value pairs
+
+        :return: dict from field name to value
+        :rtype: dict
+        """
+        return {"snapshot": self._encode_snapshot()}
 
     def keys(self):
         if self._data is None:
@@ -373,3 +1481,53 @@ class Dict(models.Model):
             self.populate()
 
         return str(self._data)
+
+
+class DictBatch:
+    """
+    Unit of work recording changes to a Dict, see `Dict.batch`
+    """
+
+    def __init__(self, owner: Dict):
+        self.owner = owner
+        self.sets = {}
+        self.deletes = set()
+        self.cleared = False
+
+    def __enter__(self) -> "DictBatch":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+
+    def __setitem__(self, key: str, value: _SingleValue):
+        self.sets[key] = value
+        self.deletes.discard(key)
+
+    def __delitem__(self, key: str):
+        if key in self.sets:
+            del self.sets[key]
+        elif self.cleared or key not in self.owner:
+            raise KeyError(key)
+        if not self.cleared:
+            self.deletes.add(key)
+
+    def update(self, data, **kwargs):
+        for key, value in dict(data, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        self.sets.clear()
+        self.deletes.clear()
+        self.cleared = True
+
+    def flush(self):
+        """
+        Write all recorded changes in a single transaction
+        """
+        if self.sets or self.deletes or self.cleared:
+            self.owner._write(self.sets, self.deletes, self.cleared)
+        self.sets = {}
+        self.deletes = set()
+        self.cleared = False
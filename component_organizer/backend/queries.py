@@ -1,151 +1,652 @@
-import re
+import base64
+import hashlib
+import json
+import operator
+from collections import defaultdict
 from functools import reduce
-from typing import Iterator
+from typing import Iterable, Iterator, NamedTuple, Optional, Tuple, Union
 
-from django.db.models import Count, QuerySet
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import QuerySet, F, Q, OrderBy, Sum
+from django.db.models.functions import Coalesce
+from django.dispatch import receiver
 
-from backend.models import StringValue, Item, Dict
+from backend import search
+from backend.helper import LRUCache, parse_percentage, get_version
+from backend.models import Item, Dict, ItemTemplate, ItemTemplateField, KeyTypeUsage, ValueUsage, StringValue, get_storage, \
+    items_changed
 
 
-def get_keys(at_least: int = 1):
+def get_keys(at_least: int = 1) -> list:
     """
-    Get all StringValues used as keys and annotate them with how many times they are used.
+    Get all keys as StringValues annotated with how many times they are used.
 
-    :param at_least: how often has a StringValue to be used as key to show up (default: 1)
+    The counts are read from `KeyTypeUsage` instead of counting the pairs.
+
+    :param at_least: how often has a key to be used to show up (default: 1)
     :type at_least: int
-    :return: annotated queryset of StringValues
+    :return: unsaved StringValues with a `uses` attribute ordered by it
+    :rtype: list
     """
-    return StringValue.objects.annotate(uses=Count("key_in_pairs__key")) \
-                              .filter(uses__gte=at_least) \
-                              .order_by("-uses", "value").all()
+    keys = []
+    for key, uses in KeyTypeUsage.objects.values_list("key").annotate(uses=Sum("uses")) \
+                                         .filter(uses__gte=at_least).order_by("-uses", "key"):
+        keys.append(StringValue(value=key))
+        keys[-1].uses = uses
+    return keys
 
 
-def get_values(key: str, at_least: int = 1):
+def get_values(key: str, at_least: int = 1) -> list:
     """
     Get all ...Values stored under the given key and annotate them with how often they are used.
 
+    The counts are read from `ValueUsage` instead of counting the pairs.
+
     :param key: key to get values for
     :type key: str
-    :param at_least: how often has a StringValue to be used as key to show up (default: 1)
+    :param at_least: how often has a value to be used to show up (default: 1)
     :type at_least: int
-    :return: annotated list of StringValues, FloatValues and so on
+    :return: unsaved StringValues, FloatValues and so on with a `uses` attribute ordered by it
+    :rtype: list
+    """
+    value_models = dict((ValueModel.api_name, ValueModel) for ValueModel in Dict.iter_value_models())
+    return [usage.to_value(value_models)
+            for usage in ValueUsage.objects.filter(key=key, uses__gte=at_least).order_by("-uses", "value")
+            if usage.value_type in value_models]
+
+
+def get_facets(queryset: QuerySet, limit: int = 10) -> list:
     """
-    values = []
-    for ValueModel in Dict.iter_value_models():
-        values.extend(ValueModel.objects.filter(value_in_pairs__key__value=key)
-                                        .annotate(uses=Count("value_in_pairs"))
-                                        .filter(uses__gte=at_least))
-    return values
+    Count how many items of a queryset have each key and each key's most common values
+
+    The pairs of all items are counted in one grouped query, so pass the whole result of `filter_items` not a page.
+
+    :param queryset: items to count, usually returned by `filter_items`
+    :type queryset: QuerySet
+    :param limit: how many values to return per key (default: 10)
+    :type limit: int
+    :return: dicts with "key", "count" and "values", a list of dicts with "value", "type" and "count",
+             both ordered by count descending, equally used values by `_SingleValue.sort_key`
+    :rtype: list
+    """
+    facets = {}
+    values = {}
+    for key, key_uses, value, uses in get_storage().facets(Dict.iter_value_models(), queryset, limit):
+        facets.setdefault(key, {"key": key, "count": key_uses, "values": []})
+        values.setdefault(key, []).append((value, uses))
+    for key, facet in facets.items():
+        # Numbers and units are sorted numerically, so "4.0" comes before "10.0"
+        values[key].sort(key=lambda value_uses: (-value_uses[1], value_uses[0].sort_key()))
+        facet["values"] = [{"value": str(value), "type": value.api_name, "count": uses} for value, uses in values[key]]
+    return sorted(facets.values(), key=lambda facet: (-facet["count"], facet["key"]))
 
 
 def filter_items(string: str, /, queryset: QuerySet = None, queried_keys: set = None) -> QuerySet:
     """
     Parse an item query into a Queryset
 
+    A query consists of lookups like "key = value" combined by "&" and "|" from left to right and grouped by brackets.
+    A lookup without key like "~ red led" searches the full text index of names and fields.
+    It is compiled into a single WHERE clause of EXISTS subqueries.
+
     :param string: Query to parse
     :type string: str
     :param queryset: An optional queryset to base the resulting one on
     :type queryset: QuerySet
     :param queried_keys: A optional set the keys used in the query are put in
     :type queried_keys: empty set
-    :return: queryset represented by the query string
+    :return: queryset represented by the query string, ordered by distance or rank if it contains `~` or `±` lookups
     :rtype: QuerySet
     """
     if queryset is None:
         queryset = Item.objects.all()
     string = string.strip()
     if string:
-        return queryset.filter(id__in=_parse_bracket(iter(string), queried_keys))
+        plan = _get_plan(string)
+        if queried_keys is not None:
+            queried_keys.update(plan.queried_keys)
+        queryset = queryset.filter(plan.condition)
+        if plan.rankings:
+            # Sort by the distances of nearest, tolerance and full text lookups in the order they appear
+            # They are selected, so `paginate` can put them into the cursor
+            distances = dict((f"distance_{i}", ranking) for i, ranking in enumerate(plan.rankings))
+            queryset = queryset.annotate(**distances) \
+                               .order_by(*(F(name).asc(nulls_last=True) for name in distances), "id")
+        return queryset
     else:
         return queryset.all()
 
 
+def sort_items(queryset: QuerySet, sort: str) -> QuerySet:
+    """
+    Sort items by the value they store under a key
+
+    Items without the key come last. The previous ordering, for example by distance, is used to break ties.
+
+    :param queryset: items to sort, usually returned by `filter_items`
+    :type queryset: QuerySet
+    :param sort: key optionally followed by ":asc" or ":desc"
+    :type sort: str
+    :return: sorted queryset, which can be paged with `paginate`
+    :rtype: QuerySet
+    :raises ValueError: when the key is empty
+    """
+    key, _, direction = sort.rpartition(":")
+    if direction not in ("asc", "desc"):
+        key, direction = sort, "asc"
+    key = key.strip()
+    if not key:
+        raise ValueError("Missing key to sort by.")
+
+    value_models = Dict.iter_value_models()
+    key_types = _get_key_types({key})
+    if key_types.get(key):
+        value_models = [ValueModel for ValueModel in value_models if ValueModel.api_name in key_types[key]]
+    columns = get_storage().sort_columns(value_models, key)
+    if not columns:
+        return queryset
+
+    ordering = [F(name).desc(nulls_last=True) if direction == "desc" else F(name).asc(nulls_last=True)
+                for name in columns]
+    return queryset.annotate(**columns).order_by(*ordering, *queryset.query.order_by)
+
+
+def paginate(queryset: QuerySet, cursor: Optional[str] = None, limit: int = 50) -> Tuple[list, Optional[str]]:
+    """
+    Get the page of a queryset following a cursor
+
+    Instead of an OFFSET the page is selected by comparing with the ordering's values of the previous page's last row,
+    so deep pages are as fast as the first one. The primary key is added to the ordering to make it stable
+    and NULLs are sorted last. Ordering by annotations requires them to be selected i.e. `annotate` not `alias`.
+
+    :param queryset: queryset to page, ordered by fields, annotations or F expressions on them
+    :type queryset: QuerySet
+    :param cursor: the cursor returned with the previous page or None for the first page
+    :type cursor: str
+    :param limit: page size
+    :type limit: int
+    :return: the page's objects and the cursor for the next page, which is None on the last page
+    :rtype: tuple of list and str
+    :raises ValueError: when the cursor is malformed
+    """
+    ordering = _get_ordering(queryset)
+    queryset = queryset.order_by(*(F(name).desc(nulls_last=True) if descending else F(name).asc(nulls_last=True)
+                                   for name, descending in ordering))
+
+    if cursor is not None:
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            raise ValueError("Malformed cursor.")
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise ValueError("Malformed cursor.")
+
+        # (a, b, id) > (x, y, z) is a > x | a = x & b > y | a = x & b = y & id > z, where NULL is larger than anything
+        after = Q(pk__in=[])
+        equal = Q()
+        for (name, descending), value in zip(ordering, values):
+            if value is None:
+                # Nothing is after NULL
+                equal &= Q(**{f"{name}__isnull": True})
+            else:
+                after |= equal & (Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+                                  | Q(**{f"{name}__isnull": True}))
+                equal &= Q(**{name: value})
+        queryset = queryset.filter(after)
+
+    # Query one more object to know whether there is a next page
+    page = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        values = [getattr(page[-1], name) for name, _ in ordering]
+        next_cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+    return page, next_cursor
+
+
+def _get_ordering(queryset: QuerySet) -> list:
+    """
+    Get a queryset's ordering as list of names followed by the primary key
+
+    :param queryset: queryset ordered by fields, annotations or F expressions on them
+    :type queryset: QuerySet
+    :return: (name, descending) tuples
+    :rtype: list
+    :raises ValueError: when the queryset is ordered by something else
+    """
+    ordering = []
+    for order in queryset.query.order_by:
+        if isinstance(order, str):
+            descending = order.startswith("-")
+            name = order.lstrip("-")
+        elif isinstance(order, OrderBy) and isinstance(order.expression, F):
+            descending = order.descending
+            name = order.expression.name
+        else:
+            raise ValueError(f"Can't page a queryset ordered by {order!r}")
+        if name == "pk":
+            name = "id"
+        ordering.append((name, descending))
+        if name == "id":
+            return ordering
+    ordering.append(("id", False))
+    return ordering
+
+
+_count_version_key = "item_count_version"
+"""Cache key of a number which is incremented whenever items change, so cached counts are superseded"""
+
+
+def count_items(string: str) -> int:
+    """
+    Count the items matching a query
+
+    The count is stored in Django's cache for ITEM_COUNT_TIMEOUT seconds or until any item changes.
+    Use a cache shared between the processes to invalidate the counts of all processes immediately.
+
+    :param string: Query to count
+    :type string: str
+    :return: number of matching items
+    :rtype: int
+    :raises ValueError: when the query is malformed
+    """
+    string = string.strip()
+    version = cache.get_or_set(_count_version_key, 0, timeout=None)
+    digest = hashlib.sha1(string.encode()).hexdigest()
+    key = f"item_count:{type(get_storage()).__name__}:{version}:{digest}"
+    count = cache.get(key)
+    if count is None:
+        count = filter_items(string).order_by().count()
+        cache.set(key, count, timeout=getattr(settings, "ITEM_COUNT_TIMEOUT", 300))
+    return count
+
+
+@receiver(items_changed)
+def _invalidate_counts(sender, **kwargs):
+    try:
+        cache.incr(_count_version_key)
+    except ValueError:
+        cache.set(_count_version_key, 1, timeout=None)
+
+
+def escape(string: str) -> str:
+    """
+    Escape a string with backslashes, so it can be used as key or value in an item query
+
+    :param string: raw key or value
+    :type string: str
+    :return: escaped string
+    :rtype: str
+    """
+    return "".join("\\" + char if char in _special_chars else char for char in string)
+
+
+class _Plan(NamedTuple):
+    """
+    A compiled item query
+    """
+    condition: Q
+    rankings: tuple
+    queried_keys: frozenset
+
+
+_plan_cache = LRUCache(getattr(settings, "QUERY_CACHE_SIZE", 256))
+"""Process local cache from (storage engine, key types generation, query tokens) to `_Plan`"""
+
+
+def _get_plan(string: str) -> _Plan:
+    """
+    Get the compiled plan for a query string from the cache or compile it
+
+    The plan is cached by the query's tokens, so differently spaced queries like "a=1" and "a = 1" share an entry.
+
+    :param string: query
+    :type string: str
+    :return: compiled query
+    :rtype: _Plan
+    :raises ValueError: when the query is malformed, errors aren't cached
+    """
+    storage = get_storage()
+    tokens = tuple(_tokenize(string))
+    cache_key = (type(storage).__name__, _key_types_generation(), tokens)
+    plan = _plan_cache.get(cache_key)
+    if plan is None:
+        tree = _parse(iter(tokens))
+        key_types = _get_key_types(set(lookup.key for lookup in _iter_lookups(tree) if lookup.key))
+        queried_keys = set()
+        rankings = []
+        condition = _compile(tree, key_types, queried_keys, rankings)
+        plan = _Plan(condition, tuple(rankings), frozenset(queried_keys))
+        _plan_cache[cache_key] = plan
+    return plan
+
+
+def _key_types_generation() -> tuple:
+    """
+    Get a version of the known key types for the plan cache
+
+    KeyTypeUsage and the templates bump their shared versions whenever a key gets a new type,
+    so plans pruned for the old types aren't reused by any process or management command.
+    The versions are kept in the shared cache configured in settings.CACHES.
+
+    :return: both versions
+    :rtype: tuple
+    """
+    return get_version(KeyTypeUsage.VERSION_KEY), get_version(ItemTemplate.FIELDS_VERSION_KEY)
+
+
+def _get_key_types(keys: set) -> dict:
+    """
+    Get the value types stored under keys or declared for them by templates
+
+    :param keys: keys to look up
+    :type keys: set of str
+    :return: dict from key to set of api_names, unknown keys are missing
+    :rtype: dict
+    """
+    key_types = defaultdict(set)
+    for key, value_type in KeyTypeUsage.objects.filter(key__in=keys).values_list("key", "value_type"):
+        key_types[key].add(value_type)
+    for key, content_type_id in ItemTemplateField.objects.filter(key__value__in=keys) \
+                                                         .values_list("key__value", "value_type"):
+        key_types[key].add(ContentType.objects.get_for_id(content_type_id).model_class().api_name)
+    return dict(key_types)
+
+
+def query_cache_info() -> dict:
+    """
+    Get statistics about the cache of compiled item queries for monitoring
+
+    :return: dict with hits, misses, size and max_size
+    :rtype: dict
+    """
+    return {"hits": _plan_cache.hits, "misses": _plan_cache.misses,
+            "size": len(_plan_cache), "max_size": _plan_cache.size}
+
+
+def clear_query_cache():
+    """
+    Drop all compiled item queries, for example after changing what lookups compile to
+    """
+    _plan_cache.clear()
+
+
 _logic_operators = {
-    "|": QuerySet.union,
-    "&": QuerySet.intersection,
+    "|": operator.or_,
+    "&": operator.and_,
 }
 
+_comparators = ("<=", ">=", "=", "<", ">", "~")
+"""Comparators in the order they are tried at each position, so <= wins over <"""
+
+_tolerance_signs = ("\u00B1", "+-")
+
+_special_chars = set("\\()" + "".join(_logic_operators) + "".join(_comparators) + "".join(_tolerance_signs))
+"""Characters which have to be escaped to be part of a key or value"""
+
+
+class _Lookup(NamedTuple):
+    """
+    A key-comparator-value term of an item query
+    """
+    key: str
+    op: str
+    value: str
+    tolerance: Optional[str] = None
+
+
+class _Combination(NamedTuple):
+    """
+    Two terms combined by "&" or "|"
+    """
+    op: str
+    left: Union[_Lookup, "_Combination"]
+    right: Union[_Lookup, "_Combination"]
+
 
-def _parse_lookup(string: str, queried_keys: set = None) -> QuerySet:
+def _tokenize(string: str) -> Iterator[Union[str, _Lookup]]:
     """
-    Parse a key-comparator-value string into a QuerySet of item ids.
+    Split an item query into brackets, logic operators and lookups
 
-    :param string: something like "  Foo = bar" (leading and trailing whitespaces are stripped)
+    A backslash escapes the following character, so it is part of a key or value
+    instead of being treated as bracket, logic operator, comparator or tolerance sign.
+
+    :param string: Query to split
     :type string: str
+    :return: "(", ")", "&", "|" and `_Lookup`s
+    :rtype: Iterator
+    """
+    chars = []
+    string_iter = iter(string)
+    for char in string_iter:
+        if char == "\\":
+            chars.append((next(string_iter, ""), True))
+        elif char in "()" or char in _logic_operators:
+            if any(escaped or not c.isspace() for c, escaped in chars):
+                yield _split_lookup(chars)
+            chars = []
+            yield char
+        else:
+            chars.append((char, False))
+    if any(escaped or not c.isspace() for c, escaped in chars):
+        yield _split_lookup(chars)
+
+
+def _find(chars: list, needles: Iterable[str]) -> Optional[Tuple[int, str]]:
+    """
+    Find the leftmost unescaped occurrence of any needle
+
+    :param chars: (character, escaped) tuples to search in
+    :type chars: list
+    :param needles: strings to search, earlier ones win at the same position
+    :type needles: iterable of str
+    :return: (index, needle) or None
+    :rtype: tuple of int and str
+    """
+    for i in range(len(chars)):
+        for needle in needles:
+            if all(i + j < len(chars) and chars[i + j] == (c, False) for j, c in enumerate(needle)):
+                return i, needle
+    return None
+
+
+def _split_lookup(chars: list) -> _Lookup:
+    """
+    Split a lookup's characters into key, comparator, value and tolerance
+
+    :param chars: (character, escaped) tuples
+    :type chars: list
+    :return: lookup with leading and trailing whitespaces stripped from its parts
+    :rtype: _Lookup
+    :raises ValueError: when there is no comparator or the tolerance is misplaced or malformed
+    """
+    def join(part):
+        return "".join(c for c, _ in part).strip()
+
+    found = _find(chars, _comparators)
+    if found is None:
+        raise ValueError("No comparator found.")
+    i, op = found
+    key, value = chars[:i], chars[i + len(op):]
+
+    tolerance = None
+    if found := _find(value, _tolerance_signs):
+        if op not in ("=", "~"):
+            raise ValueError("A tolerance can only be used with = or ~")
+        i, sign = found
+        value, tolerance = value[:i], join(value[i + len(sign):])
+        if tolerance.endswith("%"):
+            parse_percentage(tolerance)  # Reject malformed and infinite percentages right away
+        elif not tolerance:
+            raise ValueError("Missing tolerance.")
+    return _Lookup(join(key), op, join(value), tolerance)
+
+
+def _parse(tokens: Iterator[Union[str, _Lookup]], nested: bool = False) -> Union[_Lookup, _Combination]:
+    """
+    Parse tokens into a tree.
+    Logic operators don't have a precedence, they are applied from left to right: "a | b & c" is "(a | b) & c".
+
+    :param tokens: tokens returned by `_tokenize`
+    :type tokens: Iterator
+    :param nested: whether this is called for a bracket which has to be closed
+    :type nested: bool
+    :return: tree of lookups
+    :rtype: _Lookup or _Combination
+    :raises ValueError: when the query is malformed
+    """
+    tree = None
+    op = None
+    closed = False
+    for token in tokens:
+        if token == ")":
+            if not nested:
+                raise ValueError("Unmatched closing bracket.")
+            closed = True
+            break
+        elif token in _logic_operators:
+            if tree is None or op is not None:
+                raise ValueError(f"Missing lookup before {token}.")
+            op = token
+        else:
+            operand = _parse(tokens, nested=True) if token == "(" else token
+            if tree is None:
+                tree = operand
+            elif op is None:
+                raise ValueError("Missing logic operator between lookups.")
+            else:
+                tree = _Combination(op, tree, operand)
+                op = None
+
+    if nested and not closed:
+        raise ValueError("Unmatched opening bracket.")
+    if tree is None or op is not None:
+        raise ValueError("Missing lookup.")
+    return tree
+
+
+def _iter_lookups(tree: Union[_Lookup, _Combination]) -> Iterator[_Lookup]:
+    """
+    Iterate over a tree's lookups from left to right
+
+    :param tree: tree returned by `_parse`
+    :type tree: _Lookup or _Combination
+    :return: lookups
+    :rtype: Iterator[_Lookup]
+    """
+    if isinstance(tree, _Combination):
+        yield from _iter_lookups(tree.left)
+        yield from _iter_lookups(tree.right)
+    else:
+        yield tree
+
+
+def _compile(tree: Union[_Lookup, _Combination], key_types: dict = None,
+             queried_keys: set = None, rankings: list = None) -> Q:
+    """
+    Compile a tree into a single filter of correlated EXISTS predicates
+
+    :param tree: tree returned by `_parse`
+    :type tree: _Lookup or _Combination
+    :param key_types: An optional dict from key to the api_names which can be stored under it (see `_get_key_types`)
+    :type key_types: dict
     :param queried_keys: A optional set the keys used in the query are put in
     :type queried_keys: set
-    :return: QuerySet of matching items' ids
-    :rtype: QuerySet of tuples with a single int
+    :param rankings: A optional list the distance expressions of nearest and tolerance lookups are put in
+    :type rankings: list
+    :return: filter for Items
+    :rtype: Q
     """
-    comparator = re.search(r"(?<!\\)(?:=|<=|>=|<|>)", string)
-    if comparator is None:
-        raise ValueError("No comparator found.")
+    if isinstance(tree, _Combination):
+        left = _compile(tree.left, key_types, queried_keys, rankings)
+        right = _compile(tree.right, key_types, queried_keys, rankings)
+        return _logic_operators[tree.op](left, right)
     else:
-        a, b = comparator.span()
-        key = string[:a].strip()
-        op = comparator.group()
-        value = string[b:].strip()
+        return _compile_lookup(tree, key_types, queried_keys, rankings)
+
+
+def _compile_lookup(lookup: _Lookup, key_types: dict = None, queried_keys: set = None, rankings: list = None) -> Q:
+    """
+    Compile a single lookup into a disjunction over the value models it can be converted to.
+    Value models which aren't stored under the key are skipped, unless nothing is known about the key.
+
+    Besides the comparisons there are two lookups for numbers and units:
+    "R ~ 4.6 k\u2126" matches all comparable values ordered by their distance, so the closest ones come first,
+    and "C = 100 nF \u00B1 10%" (or "+-") the values within a tolerance.
+    A "~" without key is a full text search (see `_compile_text`).
 
+    :param lookup: lookup to compile
+    :type lookup: _Lookup
+    :param key_types: An optional dict from key to the api_names which can be stored under it (see `_get_key_types`)
+    :type key_types: dict
+    :param queried_keys: A optional set the keys used in the query are put in
+    :type queried_keys: set
+    :param rankings: A optional list the distance expressions of nearest and tolerance lookups are put in
+    :type rankings: list
+    :return: filter for Items
+    :rtype: Q
+    """
+    key, op, value, tolerance = lookup
+    if not key and op == "~":
+        return _compile_text(value, tolerance, rankings)
     if queried_keys is not None:
         queried_keys.add(key)
 
-    queries = []
-    for ValueModel in Dict.iter_value_models():
+    value_models = Dict.iter_value_models()
+    if key_types and key_types.get(key):
+        value_models = [ValueModel for ValueModel in value_models if ValueModel.api_name in key_types[key]]
+
+    storage = get_storage()
+    predicates = []
+    distances = []
+    for ValueModel in value_models:
         try:
             converted_value = ValueModel.convert(value)
-        except ValueError or TypeError:
+        except (ValueError, TypeError):
             continue
 
         try:
-            parsed_query = ValueModel._parse_lookup(key, op, converted_value)
-        except ValueError or KeyError:
+            if tolerance is not None:
+                predicate = storage.window(ValueModel, key, converted_value, tolerance)
+            elif op == "~":
+                predicate = storage.nearest(ValueModel, key, converted_value)
+            else:
+                predicate = storage.lookup(ValueModel, key, op, converted_value)
+        except (ValueError, KeyError):
             continue
 
-        queries.append(parsed_query)
-    return reduce(QuerySet.union, queries)
+        predicates.append(Q(predicate))
+        if tolerance is not None or op == "~":
+            distances.append(storage.distance(ValueModel, key, converted_value))
 
+    if distances and rankings is not None:
+        rankings.append(Coalesce(*distances) if len(distances) > 1 else distances[0])
+    if not predicates:
+        return Q(pk__in=[])
+    return reduce(operator.or_, predicates)
 
-def _parse_bracket(string_iter: Iterator[str], queried_keys: set = None) -> QuerySet:
-    """
-    Parse an item query from a string iterator.
-    This goes through the string calls `_parse_lookup` or itself recursively and combines the result using and/or.
 
-    :param string_iter: iterator over an item query to parse
-    :type string_iter: Iterator[str]
-    :param queried_keys: A optional set the keys used in the query are put in
-    :type queried_keys: set
-    :return: QuerySet of matching items' ids
-    :rtype: QuerySet of tuples with a single int
+def _compile_text(text: str, tolerance: Optional[str] = None, rankings: list = None) -> Q:
     """
-    if isinstance(string_iter, str):
-        string_iter = iter(string_iter)
+    Compile a full text lookup like "~ 100n ceramic" into a filter for items containing every word as prefix
+    in their name, their template's name or their fields
 
-    result = None
-    combinator = lambda x, y: y
-    lookup = ""
-    query = None
-    escaped = False
-    for char in string_iter:
-        query = None
-        if escaped:
-            lookup += char
-            escaped = False
-        elif char == "\\":
-            escaped = True
-        elif char == "(":
-            query = _parse_bracket(string_iter, queried_keys)
-        elif char == ")":
-            break
-        elif char in _logic_operators:
-            if query is None:
-                query = _parse_lookup(lookup, queried_keys)
-            lookup = ""
-            result = combinator(result, query)
-            query = None
-            combinator = _logic_operators[char]
-        else:
-            lookup += char
-
-    if query is None:
-        query = _parse_lookup(lookup, queried_keys)
-    return combinator(result, query)
+    :param text: words to search
+    :type text: str
+    :param tolerance: tolerance parsed from the lookup, which isn't allowed
+    :type tolerance: str or None
+    :param rankings: A optional list the bm25 rank of the items is put in
+    :type rankings: list
+    :return: filter for Items
+    :rtype: Q
+    :raises ValueError: when the text is empty or has a tolerance, or the database has no full text index
+    """
+    if tolerance is not None:
+        raise ValueError("A tolerance can't be used with a full text search.")
+    if rankings is not None:
+        quote = connection.ops.quote_name
+        rankings.append(search.rank(text, f"{quote(Item._meta.db_table)}.{quote(Item._meta.pk.column)}"))
+    return Q(pk__in=search.matching_ids(text))
@@ -0,0 +1,145 @@
+"""
+Full text index over items' names, template names and fields
+
+The index is an SQLite FTS5 virtual table created by a migration, whose rowids are the items' ids.
+It is updated by the items themselves whenever their fields, name or template change and by renamed templates.
+On other databases there is no index and all functions except `is_available` do nothing or raise a ValueError.
+"""
+from typing import Iterable
+
+from django.db import connection
+from django.db.models import QuerySet
+from django.db.models.expressions import RawSQL
+
+TABLE = "backend_itemsearch"
+
+WEIGHTS = (10.0, 2.0, 1.0)
+"""bm25 weights of the name, template and fields columns"""
+
+
+def is_available() -> bool:
+    """
+    Check whether the database has the full text index
+
+    :return: whether the database is SQLite
+    :rtype: bool
+    """
+    return connection.vendor == "sqlite"
+
+
+def index_items(items: Iterable):
+    """
+    Replace the index's rows of some items
+
+    :param items: populated items whose template is loaded or cheap to load
+    :type items: iterable of Item
+    """
+    if not is_available():
+        return
+    rows = [(item.id, item.display_name, item.template.name,
+             "\n".join(f"{key} {value}" for key, value in item.items()))
+            for item in items]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({', '.join('%s' for _ in rows)})",
+                       [row[0] for row in rows])
+        cursor.executemany(f"INSERT INTO {TABLE} (rowid, name, template, fields) VALUES (%s, %s, %s, %s)", rows)
+
+
+def rename_template(ids: QuerySet, name: str):
+    """
+    Replace the template name in the index's rows of a template's items
+
+    :param ids: `values("id")` queryset of the template's items
+    :type ids: QuerySet
+    :param name: template's new name
+    :type name: str
+    """
+    if not is_available():
+        return
+    sql, params = ids.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"UPDATE {TABLE} SET template = %s WHERE rowid IN ({sql})", (name, *params))
+
+
+def remove_items(ids: Iterable[int]):
+    """
+    Remove some items from the index
+
+    :param ids: ids of the items to remove
+    :type ids: iterable of int
+    """
+    ids = list(ids)
+    if not is_available() or not ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({', '.join('%s' for _ in ids)})", ids)
+
+
+def clear():
+    """
+    Remove all items from the index
+    """
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+
+
+def match_expression(text: str) -> str:
+    """
+    Turn user input into an FTS5 query which matches rows containing every word as prefix
+
+    :param text: words separated by whitespaces, FTS5's syntax isn't interpreted
+    :type text: str
+    :return: FTS5 query
+    :rtype: str
+    :raises ValueError: when there are no words
+    """
+    words = text.split()
+    if not words:
+        raise ValueError("Empty full text search.")
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+
+
+def matching_ids(text: str) -> RawSQL:
+    """
+    Get a subquery of the ids of the items matching a text
+
+    :param text: words to search
+    :type text: str
+    :return: expression to use with `id__in`
+    :rtype: RawSQL
+    :raises ValueError: when there are no words or the database has no index
+    """
+    if not is_available():
+        raise ValueError("Full text search requires SQLite.")
+    return RawSQL(f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s", (match_expression(text),))
+
+
+def rank(text: str, id_column: str) -> RawSQL:
+    """
+    Get a subquery of an item's bm25 rank for a text, lower is better
+
+    The matching rows and their ranks are materialized once per query and looked up by rowid,
+    because FTS5 would evaluate the whole MATCH again for every item when asked for a single rowid.
+    Items not matching the text get NULL.
+
+    :param text: words to search
+    :type text: str
+    :param id_column: quoted column of the outer query holding the item's id
+    :type id_column: str
+    :return: expression to order items by
+    :rtype: RawSQL
+    :raises ValueError: when there are no words or the database has no index
+    """
+    if not is_available():
+        raise ValueError("Full text search requires SQLite.")
+    weights = ", ".join(str(weight) for weight in WEIGHTS)
+    # Without the hint (SQLite >= 3.35) the CTE is flattened into a per item MATCH again
+    materialized = "MATERIALIZED " if connection.Database.sqlite_version_info >= (3, 35) else ""
+    return RawSQL(f"(WITH ranks AS {materialized}(SELECT rowid, bm25({TABLE}, {weights}) AS rank "
+                  f"FROM {TABLE} WHERE {TABLE} MATCH %s) "
+                  f"SELECT rank FROM ranks WHERE ranks.rowid = {id_column})",
+                  (match_expression(text),))
@@ -0,0 +1,32 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from backend.models import Item
+from backend.models.dict import _SingleValue
+from backend.queries import clear_query_cache
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ItemTestCase(TestCase):
+    """
+    Base class resetting the process local caches, which outlive the rolled back test transactions
+
+    The tests use their own cache, so clearing it doesn't affect a running development server.
+    """
+
+    def setUp(self):
+        cache.clear()
+        clear_query_cache()
+        _SingleValue.clear_cache()
+
+    @staticmethod
+    def create_item(**fields) -> Item:
+        item = Item.objects.create()
+        item.update(fields)
+        return item
+
+    @staticmethod
+    def ids(queryset) -> list:
+        if not queryset.ordered:
+            queryset = queryset.order_by("id")
+        return list(queryset.values_list("id", flat=True))
@@ -0,0 +1,84 @@
+from django.test import override_settings
+
+from backend.models import Item, StringValue, FloatValue, KeyTypeUsage, ValueUsage
+from backend.tests.base import ItemTestCase
+
+
+class UsageCounterTest(ItemTestCase):
+
+    @staticmethod
+    def key_types() -> dict:
+        return dict(((row.key, row.value_type), row.uses) for row in KeyTypeUsage.objects.all())
+
+    @staticmethod
+    def values() -> dict:
+        return dict(((row.key, row.value_type, row.value), row.uses) for row in ValueUsage.objects.all())
+
+    def assertRebuildEqual(self):
+        key_types, values = self.key_types(), self.values()
+        KeyTypeUsage.rebuild()
+        ValueUsage.rebuild()
+        self.assertEqual(dict((key_type, uses) for key_type, uses in self.key_types().items() if uses),
+                         dict((key_type, uses) for key_type, uses in key_types.items() if uses))
+        self.assertEqual(self.values(), values)
+
+    def test_write(self):
+        first = self.create_item(colour=StringValue.get("red"), count=FloatValue.get(1.0))
+        second = self.create_item(colour=StringValue.get("red"))
+        self.assertEqual(self.key_types(), {("colour", "string"): 2, ("count", "number"): 1})
+        self.assertEqual(self.values(), {("colour", "string", "red"): 2, ("count", "number", "1.0"): 1})
+
+        first["count"] = StringValue.get("one")
+        del second["colour"]
+        self.assertEqual(self.key_types(), {("colour", "string"): 1, ("count", "number"): 0,
+                                            ("count", "string"): 1})
+        self.assertEqual(self.values(), {("colour", "string", "red"): 1, ("count", "string", "one"): 1})
+
+        first.clear()
+        self.assertEqual(self.values(), {})
+        self.assertRebuildEqual()
+
+    def test_batch(self):
+        item = self.create_item(colour=StringValue.get("red"), count=FloatValue.get(1.0))
+        with item.batch() as fields:
+            fields["colour"] = StringValue.get("blue")
+            fields["size"] = FloatValue.get(2.0)
+            del fields["count"]
+            fields["size"] = FloatValue.get(3.0)
+        self.assertEqual(self.key_types(), {("colour", "string"): 1, ("count", "number"): 0, ("size", "number"): 1})
+        self.assertEqual(self.values(), {("colour", "string", "blue"): 1, ("size", "number", "3.0"): 1})
+
+        with item.batch() as fields:
+            fields.clear()
+            fields["colour"] = StringValue.get("blue")
+        self.assertEqual(self.values(), {("colour", "string", "blue"): 1})
+        self.assertRebuildEqual()
+
+    def test_failed_batch_is_discarded(self):
+        item = self.create_item(colour=StringValue.get("red"))
+        with self.assertRaises(RuntimeError):
+            with item.batch() as fields:
+                fields["colour"] = StringValue.get("blue")
+                raise RuntimeError()
+        self.assertEqual(self.values(), {("colour", "string", "red"): 1})
+
+    def test_stale_instance(self):
+        # The deltas come from the pairs actually replaced, not from what an outdated instance loaded
+        item = self.create_item(colour=StringValue.get("red"))
+        stale = Item.objects.get(id=item.id)
+        self.assertEqual(str(stale["colour"]), "red")
+        item.update({"colour": StringValue.get("blue"), "count": FloatValue.get(1.0)})
+
+        stale["colour"] = StringValue.get("green")
+        self.assertEqual(self.values(), {("colour", "string", "green"): 1, ("count", "number", "1.0"): 1})
+        self.assertRebuildEqual()
+
+        item.clear()
+        stale.clear()
+        self.assertEqual(self.values(), {})
+        self.assertRebuildEqual()
+
+    @override_settings(DICT_STORAGE="typed")
+    def test_typed_storage(self):
+        self.test_write()
+        self.test_stale_instance()
@@ -0,0 +1,42 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+
+from backend.models import Item, StringValue, FloatValue, UnitValue
+from backend.queries import get_facets
+from backend.tests.base import ItemTestCase
+
+
+class FacetTest(ItemTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Created in an order where neither the ids nor the strings are sorted numerically
+        for count in [10.0, 4.0, 30.0, 2.0]:
+            self.create_item(count=FloatValue.get(count))
+        for number, unit in [(2.2, "kΩ"), (470.0, "Ω"), (1.0, "kΩ")]:
+            self.create_item(R=UnitValue.get((number, unit)))
+        self.create_item(count=StringValue.get("many"), R=UnitValue.get((1.0, "kΩ")))
+        call_command("copy_pairs", stdout=StringIO())
+
+    def facets(self, limit: int) -> dict:
+        result = {}
+        for engine in ["generic", "typed"]:
+            with override_settings(DICT_STORAGE=engine):
+                result[engine] = dict((facet["key"], (facet["count"], [value["value"] for value in facet["values"]]))
+                                      for facet in get_facets(Item.objects.all(), limit))
+        self.assertEqual(result["generic"], result["typed"])
+        return result["generic"]
+
+    def test_numeric_order(self):
+        facets = self.facets(10)
+        self.assertEqual(facets["count"], (5, ["2.0", "4.0", "10.0", "30.0", "many"]))
+        # The most used value first, the others by their canonical value
+        self.assertEqual(facets["R"], (4, ["1.0 kΩ", "470.0 Ω", "2.2 kΩ"]))
+
+    def test_limit_ties(self):
+        # Equally used values are kept by their value instead of their id
+        facets = self.facets(2)
+        self.assertEqual(facets["count"], (5, ["2.0", "4.0"]))
+        self.assertEqual(facets["R"], (4, ["1.0 kΩ", "470.0 Ω"]))
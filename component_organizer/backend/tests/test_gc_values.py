@@ -0,0 +1,96 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import override_settings
+
+from backend.helper import get_version
+from backend.models import StringValue, FloatValue, UnitValue, FileValue
+from backend.models.dict import VALUE_CACHE_VERSION_KEY
+from backend.tests.base import ItemTestCase
+
+
+class GarbageCollectionTest(ItemTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.TemporaryDirectory()
+        self.cache = tempfile.TemporaryDirectory()
+        self.settings = override_settings(MEDIA_ROOT=self.media.name, CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": self.cache.name,
+        }})
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.media.cleanup()
+        self.cache.cleanup()
+        super().tearDown()
+
+    def collect(self, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("gc_values", "--grace-period", "0", *args, stdout=StringIO())
+
+    def create_file(self, name: str) -> str:
+        with open(os.path.join(self.media.name, name), "w") as file:
+            file.write(name)
+        return name
+
+    def test_values(self):
+        item = self.create_item(R=UnitValue.get((4.7, "kΩ")), colour=StringValue.get("red"))
+        unused = [StringValue.get("unused"), FloatValue.get(3.0), UnitValue.get((1.0, "V"))]
+        self.collect()
+        self.assertFalse(any(type(value).objects.filter(id=value.id).exists() for value in unused))
+        self.assertEqual(item["R"].number.value, 4.7)
+        for value in ["R", "colour", "red", "kΩ"]:
+            self.assertTrue(StringValue.objects.filter(value=value).exists(), value)
+        self.assertTrue(FloatValue.objects.filter(value=4.7).exists())
+
+    def test_files(self):
+        used = FileValue.objects.create(value=self.create_file("used.txt"))
+        FileValue.objects.create(value="used.txt")  # An unused duplicate of a used file
+        FileValue.objects.create(value=self.create_file("unused.txt"))
+        self.create_file("orphan.txt")
+        self.create_item(datasheet=used)
+
+        self.collect()
+        self.assertEqual(list(FileValue.objects.values_list("id", flat=True)), [used.id])
+        self.assertTrue(default_storage.exists("used.txt"))
+        self.assertFalse(default_storage.exists("unused.txt"))
+        self.assertFalse(default_storage.exists("orphan.txt"))
+
+    def test_dry_run(self):
+        value = StringValue.get("unused")
+        self.create_file("orphan.txt")
+        self.collect("--dry-run")
+        self.assertTrue(StringValue.objects.filter(id=value.id).exists())
+        self.assertTrue(default_storage.exists("orphan.txt"))
+
+    def test_invalidates_value_caches(self):
+        StringValue.get("unused")
+        version = get_version(VALUE_CACHE_VERSION_KEY)
+        self.collect()
+        self.assertNotEqual(cache.get(VALUE_CACHE_VERSION_KEY), version)
+
+    def test_requires_shared_cache(self):
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            with self.assertRaises(CommandError):
+                self.collect()
+            self.collect("--dry-run")
+
+    @override_settings(DICT_STORAGE="typed")
+    def test_typed_pairs(self):
+        used = FileValue.objects.create(value=self.create_file("used.txt"))
+        item = self.create_item(datasheet=used)
+        self.collect()
+        self.assertTrue(FileValue.objects.filter(id=used.id).exists())
+        self.assertTrue(default_storage.exists("used.txt"))
+
+        del item["datasheet"]
+        self.collect()
+        self.assertFalse(FileValue.objects.filter(id=used.id).exists())
+        self.assertFalse(default_storage.exists("used.txt"))
@@ -0,0 +1,19 @@
+from django.test import SimpleTestCase
+
+from backend.helper import split_unit, canonicalize_unit
+
+
+class UnitTest(SimpleTestCase):
+
+    def test_split_unit(self):
+        for unit, expected in [("kΩ", (3, "Ω")), ("µF", (-6, "F")), ("uF", (-6, "F")),
+                               ("MHz", (6, "Hz")), ("mA", (-3, "A")), ("kWh", (3, "Wh")), ("V", (0, "V")),
+                               ("m", (0, "m")), ("mm", (-3, "m")), ("m/s", (0, "m/s")), ("m²", (0, "m²")),
+                               ("mol", (0, "mol")), ("ppm", (0, "ppm")), ("Gy", (0, "Gy")), (" kV ", (3, "V"))]:
+            with self.subTest(unit=unit):
+                self.assertEqual(split_unit(unit), expected)
+
+    def test_canonicalize_unit(self):
+        self.assertEqual(canonicalize_unit(4.7, "kΩ"), (4700.0, "Ω"))
+        self.assertEqual(canonicalize_unit(100, "nF"), (1e-7, "F"))
+        self.assertEqual(canonicalize_unit(3.3, "m/s"), (3.3, "m/s"))
@@ -0,0 +1,82 @@
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+
+from backend.models import Item, FloatValue
+from backend.queries import filter_items, paginate, count_items, sort_items
+from backend.tests.base import ItemTestCase
+
+
+class PaginateTest(ItemTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for number in [3.0, 1.0, 2.0, 3.0, None, 1.0, None, 5.0, 3.0]:
+            self.create_item(**({} if number is None else {"number": FloatValue.get(number)}))
+
+    def walk(self, queryset, limit: int) -> list:
+        ids = []
+        page, cursor = paginate(queryset, limit=limit)
+        ids.extend(item.id for item in page)
+        while cursor is not None:
+            page, cursor = paginate(queryset, cursor, limit)
+            self.assertTrue(page)
+            ids.extend(item.id for item in page)
+        return ids
+
+    def test_walk(self):
+        ids = self.ids(Item.objects.all())
+        for limit in (1, 2, 4, 20):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.walk(Item.objects.order_by("id"), limit), ids)
+                self.assertEqual(self.walk(filter_items(""), limit), ids)
+                self.assertEqual(self.walk(filter_items("number >= 2"), limit), self.ids(filter_items("number >= 2")))
+
+    def test_sort_items(self):
+        items = list(Item.objects.order_by("id"))
+        numbers = dict((item.id, item["number"].value) for item in items if "number" in item)
+        ascending = sorted(numbers, key=lambda id_: (numbers[id_], id_))
+        descending = sorted(numbers, key=lambda id_: (-numbers[id_], id_))
+        # Items without the key come last in both directions
+        missing = [item.id for item in items if item.id not in numbers]
+
+        for limit in (1, 2, 4, 20):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.walk(sort_items(filter_items(""), "number"), limit), ascending + missing)
+                self.assertEqual(self.walk(sort_items(filter_items(""), "number:desc"), limit), descending + missing)
+
+    def test_malformed_sort(self):
+        with self.assertRaises(ValueError):
+            sort_items(filter_items(""), ":desc")
+        queryset = sort_items(filter_items(""), "number")
+        for cursor in ["bnVsbA==", "WzFd"]:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    paginate(queryset, cursor)
+
+    def test_nearest(self):
+        expected = self.ids(filter_items("number ~ 2.5"))
+        # Ordered by distance, 2 and 3 are equally close, items without a number aren't matched
+        self.assertEqual(len(expected), 7)
+        for limit in (1, 3):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.walk(filter_items("number ~ 2.5"), limit), expected)
+
+    def test_malformed_cursor(self):
+        # The cursor has to hold the distance and the id
+        queryset = filter_items("number ~ 2.5")
+        for cursor in ["not base64!", "bnVsbA==", "WzFd"]:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    paginate(queryset, cursor)
+
+    def test_count_items(self):
+        self.assertEqual(count_items("number = 3"), 3)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(count_items(" number = 3 "), 3)
+        self.assertEqual(len(queries), 0)
+
+        # Changing any item supersedes the cached counts
+        self.create_item(number=FloatValue.get(3.0))
+        self.assertEqual(count_items("number = 3"), 4)
+        Item.objects.filter(id__in=filter_items("number = 3").values("id")[:1]).get().delete()
+        self.assertEqual(count_items("number = 3"), 3)
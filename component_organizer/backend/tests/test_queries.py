@@ -0,0 +1,143 @@
+from django.core.cache import cache
+
+from backend.models import StringValue, FloatValue, UnitValue, ItemTemplate, ItemTemplateField, KeyTypeUsage
+from backend.queries import filter_items, query_cache_info
+from backend.tests.base import ItemTestCase
+
+
+class QueryLanguageTest(ItemTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.red = self.create_item(colour=StringValue.get("red"), count=FloatValue.get(1.0),
+                                    R=UnitValue.get((1.0, "kΩ")))
+        self.green = self.create_item(colour=StringValue.get("green"), count=FloatValue.get(4.0),
+                                      R=UnitValue.get((470.0, "Ω")))
+        self.blue = self.create_item(colour=StringValue.get("blue"), count=FloatValue.get(12.0))
+        self.many = self.create_item(count=StringValue.get("many"), **{"a&b": StringValue.get("(x)")})
+
+    def test_comparisons(self):
+        self.assertEqual(self.ids(filter_items("colour = red")), [self.red.id])
+        # Values are compared as every type they can be converted to, "many" > "3" as strings
+        self.assertEqual(self.ids(filter_items("count > 3")), [self.green.id, self.blue.id, self.many.id])
+        self.assertEqual(self.ids(filter_items("count <= 4")), [self.red.id, self.green.id])
+        self.assertEqual(self.ids(filter_items("count = many")), [self.many.id])
+        self.assertEqual(self.ids(filter_items("R >= 1000 Ω")), [self.red.id])
+        self.assertEqual(self.ids(filter_items("R < 1 kΩ")), [self.green.id])
+        self.assertEqual(self.ids(filter_items("missing = 1")), [])
+        self.assertEqual(self.ids(filter_items("")), [self.red.id, self.green.id, self.blue.id, self.many.id])
+
+    def test_combinations(self):
+        self.assertEqual(self.ids(filter_items("colour = red | colour = blue")), [self.red.id, self.blue.id])
+        self.assertEqual(self.ids(filter_items("count > 3 & colour = green")), [self.green.id])
+        # Operators are applied from left to right
+        self.assertEqual(self.ids(filter_items("colour = red | colour = blue & count > 3")), [self.blue.id])
+        self.assertEqual(self.ids(filter_items("colour = red | (colour = blue & count > 3)")),
+                         [self.red.id, self.blue.id])
+
+    def test_escapes(self):
+        self.assertEqual(self.ids(filter_items("a\\&b = \\(x\\)")), [self.many.id])
+
+    def test_malformed(self):
+        for query in ["colour", "(colour = red", "colour = red)", "colour = red |", "& colour = red",
+                      "()"]:
+            with self.subTest(query=query):
+                with self.assertRaises(ValueError):
+                    filter_items(query)
+
+    def test_malformed_page(self):
+        for query, error in [("(colour = red", "Unmatched opening bracket."),
+                             ("count = 1 ± abc%", "is no percentage")]:
+            with self.subTest(query=query):
+                response = self.client.get("/items", {"query": query})
+                self.assertContains(response, error)
+
+    def test_plan_cache(self):
+        filter_items("colour=red")
+        info = query_cache_info()
+        filter_items("colour = red")
+        filter_items(" colour  =  red ")
+        self.assertEqual(query_cache_info()["size"], info["size"])
+        self.assertEqual(query_cache_info()["hits"], info["hits"] + 2)
+
+
+class ValueLookupTest(ItemTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.r4k7_0603 = self.create_item(R=UnitValue.get((4.7, "kΩ")), Package=StringValue.get("0603"))
+        self.r4k7_0805 = self.create_item(R=UnitValue.get((4.7, "kΩ")), Package=StringValue.get("0805"))
+        self.r4k3_0805 = self.create_item(R=UnitValue.get((4300.0, "Ω")), Package=StringValue.get("0805"))
+        self.r10k_0805 = self.create_item(R=UnitValue.get((10.0, "kΩ")), Package=StringValue.get("0805"))
+        self.r4v7 = self.create_item(R=UnitValue.get((4.6, "V")))
+        self.count = self.create_item(count=FloatValue.get(5.0))
+
+    def test_nearest(self):
+        self.assertEqual(self.ids(filter_items("R ~ 4.6 kΩ")),
+                         [self.r4k7_0603.id, self.r4k7_0805.id, self.r4k3_0805.id, self.r10k_0805.id])
+        # The other lookups are applied before choosing the closest values
+        self.assertEqual(self.ids(filter_items("R ~ 4.6 kΩ & Package = 0805")),
+                         [self.r4k7_0805.id, self.r4k3_0805.id, self.r10k_0805.id])
+        self.assertEqual(self.ids(filter_items("Package = 0805 & R ~ 12000 Ω")),
+                         [self.r10k_0805.id, self.r4k7_0805.id, self.r4k3_0805.id])
+        self.assertEqual(self.ids(filter_items("count ~ 1")), [self.count.id])
+
+    def test_tolerance(self):
+        self.assertEqual(self.ids(filter_items("R = 4.5 kΩ ± 5%")), [self.r4k7_0603.id, self.r4k7_0805.id,
+                                                                    self.r4k3_0805.id])
+        self.assertEqual(self.ids(filter_items("R = 4.5 kΩ ± 300 Ω & Package = 0805")),
+                         [self.r4k7_0805.id, self.r4k3_0805.id])
+        self.assertEqual(self.ids(filter_items("R ~ 4.4 kΩ +- 10%")), [self.r4k3_0805.id, self.r4k7_0603.id,
+                                                                      self.r4k7_0805.id])
+        self.assertEqual(self.ids(filter_items("count = 5 ± 0")), [self.count.id])
+        # A tolerance in another unit doesn't match anything
+        self.assertEqual(self.ids(filter_items("R = 4.7 kΩ ± 1 V")), [])
+
+    def test_invalid_tolerance(self):
+        for query in ["R = 1 kΩ ± abc%", "R = 1 kΩ ± %", "R = 1 kΩ ± inf%", "R = 1 kΩ ± 1e999%",
+                      "R = 1 kΩ ± NaN%", "R = 1 kΩ ±", "R > 1 kΩ ± 1 Ω", "~ red ± 1"]:
+            with self.subTest(query=query):
+                with self.assertRaises(ValueError):
+                    list(filter_items(query))
+        self.assertEqual(self.ids(filter_items("count = 5 ± inf")), [])
+        self.assertEqual(self.ids(filter_items("count = 5 ± 1e999")), [])
+
+    def test_invalid_tolerance_response(self):
+        for query in ["R = 1 kΩ ± abc%", "R = 1 kΩ ± %"]:
+            with self.subTest(query=query):
+                response = self.client.get("/api/item", {"query": query})
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()["success"])
+
+
+class KeyTypePruningTest(ItemTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.number = self.create_item(x=FloatValue.get(5.0))
+
+    def test_pruned_types(self):
+        self.assertEqual(self.ids(filter_items("x > 3")), [self.number.id])
+        # A new type for the key invalidates the plan pruned to numbers
+        with self.captureOnCommitCallbacks(execute=True):
+            text = self.create_item(x=StringValue.get("zzz"))
+        self.assertEqual(self.ids(filter_items("x > 3")), [self.number.id, text.id])
+
+    def test_other_process(self):
+        self.assertEqual(self.ids(filter_items("x > 3")), [self.number.id])
+        # A write of another process, which only reaches this one through the shared version
+        text = self.create_item(x=StringValue.get("zzz"))
+        self.assertEqual(self.ids(filter_items("x > 3")), [self.number.id])
+        cache.set(KeyTypeUsage.VERSION_KEY, "changed elsewhere")
+        self.assertEqual(self.ids(filter_items("x > 3")), [self.number.id, text.id])
+
+    def test_template_fields(self):
+        self.assertEqual(self.ids(filter_items("x > 3")), [self.number.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            template = ItemTemplate.objects.create(name="T", parent_id=0)
+            ItemTemplateField.objects.create(template=template, key=StringValue.get("x"),
+                                             value_type=StringValue.content_type())
+        text = self.create_item(x=StringValue.get("zzz"))
+        KeyTypeUsage.objects.filter(key="x", value_type="string").delete()
+        self.assertEqual(self.ids(filter_items("x > 3")), [self.number.id, text.id])
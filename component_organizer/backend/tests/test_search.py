@@ -0,0 +1,56 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from backend import search
+from backend.models import Item, ItemTemplate, StringValue
+from backend.queries import filter_items
+from backend.tests.base import ItemTestCase
+
+
+class SearchTest(ItemTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.template = ItemTemplate.objects.create(name="Resistor", parent_id=0)
+        self.resistor = Item.objects.create(template=self.template)
+        self.resistor.update({"colour": StringValue.get("brown")})
+        self.led = self.create_item(colour=StringValue.get("red"), kind=StringValue.get("LED"))
+
+    def search(self, text: str) -> list:
+        return list(filter_items("~ " + text).values_list("id", flat=True))
+
+    def test_fields(self):
+        self.assertEqual(self.search("red"), [self.led.id])
+        self.assertEqual(self.search("RE LE"), [self.led.id])
+        self.assertEqual(self.search("red brown"), [])
+        self.led.update({"colour": StringValue.get("green")})
+        self.assertEqual(self.search("red"), [])
+        self.assertEqual(self.search("green"), [self.led.id])
+
+    def test_template_rename(self):
+        self.assertEqual(self.search("resis"), [self.resistor.id])
+        self.template.name = "Capacitor"
+        self.template.save()
+        self.assertEqual(self.search("resis"), [])
+        self.assertEqual(self.search("capac"), [self.resistor.id])
+
+    def test_rank(self):
+        # A template name weighs more than a field, regardless of the ids
+        led = Item.objects.create(template=ItemTemplate.objects.create(name="LED", parent_id=0))
+        self.assertEqual(self.search("led"), [led.id, self.led.id])
+        self.assertEqual(list(filter_items("~ led | colour = brown").values_list("id", flat=True)),
+                         [led.id, self.led.id, self.resistor.id])
+
+    def test_deleted(self):
+        self.led.delete()
+        self.assertEqual(self.search("red"), [])
+
+    def test_rebuild(self):
+        search.clear()
+        self.assertEqual(self.search("red"), [])
+        stdout = StringIO()
+        call_command("rebuild_search_index", "--batch-size", "1", stdout=stdout)
+        self.assertIn(f"Indexed {Item.objects.count()} items", stdout.getvalue())
+        self.assertEqual(self.search("red"), [self.led.id])
+        self.assertEqual(self.search("resis"), [self.resistor.id])
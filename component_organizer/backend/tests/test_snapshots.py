@@ -0,0 +1,62 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from backend.models import Item, StringValue, FloatValue, UnitValue
+from backend.queries import filter_items
+from backend.tests.base import ItemTestCase
+
+
+class SnapshotTest(ItemTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.item = self.create_item(colour=StringValue.get("red"), count=FloatValue.get(2.0),
+                                     R=UnitValue.get((4.7, "kΩ")))
+
+    def fields(self, item) -> dict:
+        return dict((key, str(value)) for key, value in item.items())
+
+    def test_read_from_snapshot(self):
+        item = Item.objects.get(id=self.item.id)
+        with self.assertNumQueries(0):
+            item.populate()
+        self.assertEqual(self.fields(item), self.fields(self.item))
+        self.assertEqual(item["R"].canonical, self.item["R"].canonical)
+
+    def test_write_updates_snapshot(self):
+        self.item["count"] = FloatValue.get(3.0)
+        del self.item["colour"]
+        item = Item.objects.get(id=self.item.id)
+        self.assertEqual(sorted(item.snapshot), ["R", "count"])
+        self.assertEqual(self.fields(Item.populate_queryset(Item.objects.filter(id=item.id))[0]),
+                         {"R": str(self.item["R"]), "count": "3.0"})
+
+    def test_outdated_instances(self):
+        first = Item.objects.get(id=self.item.id)
+        second = Item.objects.get(id=self.item.id)
+        first.populate()
+        second.populate()
+        first["x"] = StringValue.get("one")
+        second["y"] = StringValue.get("two")
+
+        item = Item.objects.get(id=self.item.id)
+        self.assertEqual(sorted(item.snapshot), ["R", "colour", "count", "x", "y"])
+        self.assertEqual(self.ids(filter_items("~ one")), [item.id])
+        self.assertEqual(self.ids(filter_items("x = one & y = two")), [item.id])
+
+        first.clear()
+        self.assertEqual(Item.objects.get(id=self.item.id).snapshot, {})
+
+    def test_build_snapshots(self):
+        Item.objects.filter(id=self.item.id).update(snapshot=None)
+        item = Item.objects.get(id=self.item.id)
+        item.populate()
+        self.assertEqual(self.fields(item), self.fields(self.item))
+
+        call_command("build_snapshots", stdout=StringIO())
+        item = Item.objects.get(id=self.item.id)
+        self.assertEqual(sorted(item.snapshot), ["R", "colour", "count"])
+        with self.assertNumQueries(0):
+            item.populate()
+        self.assertEqual(self.fields(item), self.fields(self.item))
@@ -0,0 +1,78 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+
+from backend.models import Item, TypedPair, StringValue, FloatValue, UnitValue, FileValue
+from backend.queries import filter_items, sort_items, get_facets
+from backend.tests.base import ItemTestCase
+
+
+class StorageEngineTest(ItemTestCase):
+
+    queries = [
+        "",
+        "colour = red",
+        "colour > g",
+        "count > 3",
+        "count <= 3 | colour = blue",
+        "(count >= 2 & count < 10) & colour = green",
+        "R = 1 kΩ",
+        "R > 500 Ω",
+        "R = 1 kΩ ± 10%",
+        "R = 1000 Ω ± 200 Ω",
+        "R ~ 900 Ω",
+        "count ~ 4",
+        "count = 5 ± 1",
+        "~ red",
+        "~ gree | count = 1",
+        "missing = 1",
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.create_item(colour=StringValue.get("red"), count=FloatValue.get(1.0), R=UnitValue.get((1.0, "kΩ")))
+        self.create_item(colour=StringValue.get("green"), count=FloatValue.get(4.0), R=UnitValue.get((1.05, "kΩ")))
+        self.create_item(colour=StringValue.get("blue"), count=FloatValue.get(5.0), R=UnitValue.get((470.0, "Ω")))
+        self.create_item(colour=StringValue.get("greenish"), R=UnitValue.get((1.2, "kΩ")))
+        self.create_item(count=FloatValue.get(12.0), R=UnitValue.get((1.0, "V")))
+        self.create_item(count=StringValue.get("many"), datasheet=FileValue.objects.create(value="a.pdf"))
+        call_command("copy_pairs", stdout=StringIO())
+
+    def test_copy_pairs(self):
+        self.assertEqual(TypedPair.objects.count(), 15)
+        with override_settings(DICT_STORAGE="typed"):
+            typed = [dict((key, str(value)) for key, value in item.items())
+                     for item in Item.populate_queryset(Item.objects.order_by("id"), use_snapshots=False)]
+        generic = [dict((key, str(value)) for key, value in item.items())
+                   for item in Item.populate_queryset(Item.objects.order_by("id"), use_snapshots=False)]
+        self.assertEqual(typed, generic)
+
+    def test_filter_items(self):
+        for query in self.queries:
+            with self.subTest(query=query):
+                generic = self.ids(filter_items(query))
+                with override_settings(DICT_STORAGE="typed"):
+                    typed = self.ids(filter_items(query))
+                self.assertEqual(generic, typed)
+        self.assertEqual(len(self.ids(filter_items("colour > g"))), 3)
+
+    def test_sort_and_facets(self):
+        for key in ["count", "R:desc", "colour"]:
+            with self.subTest(key=key):
+                generic = self.ids(sort_items(filter_items(""), key))
+                with override_settings(DICT_STORAGE="typed"):
+                    typed = self.ids(sort_items(filter_items(""), key))
+                self.assertEqual(generic, typed)
+        generic = get_facets(filter_items("R > 1 Ω"))
+        with override_settings(DICT_STORAGE="typed"):
+            self.assertEqual(get_facets(filter_items("R > 1 Ω")), generic)
+
+    @override_settings(DICT_STORAGE="typed")
+    def test_write(self):
+        item = Item.objects.order_by("id").first()
+        item["colour"] = StringValue.get("black")
+        del item["count"]
+        self.assertEqual(dict(TypedPair.objects.filter(owner=item).values_list("key", "value_str")),
+                         {"colour": "black", "R": "kΩ"})
+        self.assertEqual(self.ids(filter_items("colour = black & R = 1000 Ω")), [item.id])
@@ -0,0 +1,102 @@
+from backend.models import Container, Category, Item, ItemLocation
+from backend.tests.base import ItemTestCase
+
+
+class TreePathTest(ItemTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.a = Category.objects.create(id=4, name="a", parent_id=0)
+        self.b = Category.objects.create(id=5, name="b", parent=self.a)
+        self.c = Category.objects.create(id=6, name="c", parent=self.b)
+        # Its id starts like a's, but it isn't in a's subtree
+        self.d = Category.objects.create(id=40, name="d", parent_id=0)
+
+    @staticmethod
+    def paths() -> dict:
+        return dict(Category.objects.values_list("id", "path"))
+
+    def test_create(self):
+        self.assertEqual(self.paths(), {0: "0/", 4: "0/4/", 5: "0/4/5/", 6: "0/4/5/6/", 40: "0/40/"})
+        self.assertEqual(Category.objects.get(id=6).path_ids, [0, 4, 5, 6])
+        self.assertEqual(sorted(self.a.descendants.values_list("id", flat=True)), [5, 6])
+        self.assertEqual(sorted(Category.objects.filter(**Category._subtree_lookup("0/4/"))
+                                                .values_list("id", flat=True)), [4, 5, 6])
+
+    def test_move(self):
+        self.b.parent = self.d
+        self.b.save()
+        self.assertEqual(self.paths(), {0: "0/", 4: "0/4/", 5: "0/40/5/", 6: "0/40/5/6/", 40: "0/40/"})
+        self.assertEqual(list(self.a.descendants), [])
+        self.assertEqual(sorted(self.d.descendants.values_list("id", flat=True)), [5, 6])
+
+        # An outdated instance doesn't write its old path back
+        stale = Category.objects.get(id=6)
+        self.b.parent = self.a
+        self.b.save()
+        stale.name = "renamed"
+        stale.save()
+        self.assertEqual(self.paths()[6], "0/4/5/6/")
+
+    def test_query_subtrees(self):
+        root = Category.objects.get(id=0)
+        nodes = Category.query_subtrees([root], depth=None)
+        self.assertEqual(sorted(nodes), [4, 5, 6, 40])
+        self.assertEqual([node.id for node in root.children], [4, 40])
+        self.assertEqual([node.id for node in nodes[5].children], [6])
+        self.assertEqual(nodes[6].depth, 3)
+
+        self.assertEqual([node.id for node in root.get_children(depth=1)], [4, 40])
+        self.assertFalse(root.children[0].children_loaded)
+
+        nodes = Category.query_subtrees([root], depth=None, limit=2)
+        self.assertEqual(sorted(nodes), [4, 40])
+        self.assertFalse(nodes[4].children_loaded)
+
+
+class ContainerStockTest(ItemTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.shelf = Container.objects.create(name="shelf", parent_id=0)
+        self.box = Container.objects.create(name="box", parent=self.shelf)
+        self.drawer = Container.objects.create(name="drawer", parent_id=0)
+        self.item = Item.objects.create()
+
+    @staticmethod
+    def amounts() -> dict:
+        return dict((id_, (direct, total))
+                    for id_, direct, total in Container.objects.values_list("id", "direct_amount", "total_amount"))
+
+    def test_locations(self):
+        location = ItemLocation.objects.create(parent=self.box, item=self.item, amount=3)
+        ItemLocation.objects.create(parent=self.shelf, item=self.item, amount=2)
+        self.assertEqual(self.amounts(), {0: (0, 5), self.shelf.id: (2, 5), self.box.id: (3, 3),
+                                          self.drawer.id: (0, 0)})
+
+        location.amount = 1
+        location.save()
+        self.assertEqual(self.amounts()[self.box.id], (1, 1))
+        self.assertEqual(self.amounts()[self.shelf.id], (2, 3))
+
+        location.parent = self.drawer
+        location.save()
+        self.assertEqual(self.amounts(), {0: (0, 3), self.shelf.id: (2, 2), self.box.id: (0, 0),
+                                          self.drawer.id: (1, 1)})
+
+        location.delete()
+        self.assertEqual(self.amounts(), {0: (0, 2), self.shelf.id: (2, 2), self.box.id: (0, 0),
+                                          self.drawer.id: (0, 0)})
+
+    def test_move(self):
+        ItemLocation.objects.create(parent=self.box, item=self.item, amount=3)
+        # The instance's amounts are outdated, the stored ones are moved
+        self.box.parent = self.drawer
+        self.box.save()
+        self.assertEqual(self.amounts(), {0: (0, 3), self.shelf.id: (0, 0), self.box.id: (3, 3),
+                                          self.drawer.id: (0, 3)})
+
+    def test_delete_container(self):
+        ItemLocation.objects.create(parent=self.box, item=self.item, amount=3)
+        self.box.delete()
+        self.assertEqual(self.amounts(), {0: (0, 0), self.shelf.id: (0, 0), self.drawer.id: (0, 0)})
@@ -0,0 +1,37 @@
+from backend.models import StringValue, FloatValue, UnitValue
+from backend.models.dict import _SingleValue
+from backend.tests.base import ItemTestCase
+
+
+class ValueCacheTest(ItemTestCase):
+
+    def assertCanonical(self, value: UnitValue, canonical: float, base_unit: str):
+        self.assertAlmostEqual(value.canonical, canonical)
+        self.assertEqual(value.base_unit, base_unit)
+
+    def test_bulk_get(self):
+        values = StringValue.bulk_get(["a", "b"])
+        self.assertEqual(set(values), {"a", "b"})
+        self.assertEqual(StringValue.bulk_get(["a", "c"])["a"].id, values["a"].id)
+        self.assertEqual(StringValue.objects.count(), 3)
+
+    def test_interned(self):
+        value = FloatValue.get(1.5)
+        self.assertEqual(FloatValue.get(1.5).id, value.id)
+        # Values are interned when the transaction commits, which TestCase only simulates
+        with self.captureOnCommitCallbacks(execute=True):
+            FloatValue._intern_values({1.5: value})
+        with self.assertNumQueries(0):
+            self.assertEqual(FloatValue.get(1.5).id, value.id)
+
+    def test_unit_columns(self):
+        created = UnitValue.get((5.0, "V"))
+        self.assertCanonical(created, 5.0, "V")
+        _SingleValue.clear_cache()
+        self.assertCanonical(UnitValue.get((5.0, "V")), 5.0, "V")
+        self.assertCanonical(UnitValue.get((4.7, "kΩ")), 4700.0, "Ω")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UnitValue._intern_values({(4.7, "kΩ"): UnitValue.get((4.7, "kΩ"))})
+        with self.assertNumQueries(0):
+            self.assertCanonical(UnitValue.get((4.7, "kΩ")), 4700.0, "Ω")
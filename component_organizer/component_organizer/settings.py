@@ -84,6 +84,17 @@ DATABASES = {
 }
 
 
+# Processes invalidate each other's caches of templates, values and compiled queries through versions
+# stored in this cache (see backend.helper.get_version), so it has to be shared by all of them.
+# Use e.g. redis when the processes run on several hosts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -128,6 +139,21 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# How many value ids (keys, units, numbers, ...) each process caches to save lookups when writing items
+VALUE_CACHE_SIZE = 10000
+
+# Where items store their fields: "generic" uses KeyValuePair referencing the value tables,
+# "typed" uses TypedPair's typed columns which can be filtered without joins.
+# Run `manage.py copy_pairs` before switching to "typed" on an existing database.
+DICT_STORAGE = "generic"
+
+# How many compiled item queries each process caches, paging through a search reuses its query
+QUERY_CACHE_SIZE = 256
+
+# How many seconds the number of items matching a query is cached, writes invalidate it earlier.
+# With the default per-process cache other processes only see writes after this timeout.
+ITEM_COUNT_TIMEOUT = 300
+
 _LOGGING = {
     "version": 1,
     "handlers": {
@@ -1,5 +1,5 @@
 import json
-from typing import Type, Union
+from typing import Type, Union, Optional
 
 from django.db.models import Sum
 from django.forms import ModelForm, HiddenInput
@@ -7,28 +7,33 @@ from django.http import HttpRequest, HttpResponseRedirect
 from django.shortcuts import render, get_object_or_404
 from django.views.generic import TemplateView, CreateView
 
-from backend.models import Container, Item, ItemTemplate
+from backend.models import Container, Item, ItemTemplate, ItemLocation
 from backend.models.base import _TreeNode
-from backend.queries import filter_items
+from backend.queries import filter_items, escape, paginate, count_items, sort_items
 
 
-def _get_containers(cls: Type[_TreeNode], root: Union[_TreeNode, int], depth: int = 64):
+def _get_containers(cls: Type[_TreeNode], root: Union[_TreeNode, int], depth: Optional[int] = None,
+                    limit: Optional[int] = None):
     """
     Query a `Container` / `ItemTemplate` / `Category` tree and reformat it into a jsonable dict.
     This dict will be in the format which the `ContainerTree` component (see `trees.js`) expects.
+    Nodes whose children haven't been queried have `null` as children and will be loaded lazily.
+    If the root's children have been cut off by `limit`, the root has a `next` cursor to load the rest.
 
     :param cls: A tree model to query
     :type cls: subclass of _TreeNode
     :param root: Root node to query children from
     :type root: instance of `cls` or primary key
-    :param depth: How many layer of children to query:
-    :type depth: integer
+    :param depth: How many layer of children to query (default None for the whole tree)
+    :type depth: integer or None
+    :param limit: How many nodes to query at most (default None for unlimited)
+    :type limit: integer or None
     :return: tree as a jsonable dict
     :rtype: dictionary
     """
     if isinstance(root, int):
         root = cls.objects.get(id=root)
-    root.get_children(depth)
+    root.get_children(depth, limit)
 
     nodes = {}
     def add(node: _TreeNode):
@@ -36,10 +41,18 @@ def _get_containers(cls: Type[_TreeNode], root: Union[_TreeNode, int], depth: in
             "name": node.name,
             "parent": node.parent_id,
             "children": [child.id for child in node.children]
+                        if getattr(node, "children_loaded", True) else None,
         }
+        if isinstance(node, Container):
+            nodes[node.id]["amount"] = node.direct_amount
+            nodes[node.id]["totalAmount"] = node.total_amount
         for child in node.children:
             add(child)
     add(root)
+    if not root.children_loaded:
+        # The limit cut off the root's children, the rest is paged like by the children endpoint
+        nodes[root.id]["children"] = [child.id for child in root.children]
+        nodes[root.id]["next"] = root.children[-1].id if root.children else -1
 
     return nodes
 
@@ -68,22 +81,42 @@ class ItemListView(TemplateView):
     def get(self, request: HttpRequest, *args, **kwargs):
         # Create query
         query = request.GET.get("query", "")
+        text = request.GET.get("text", "").strip()
+        if text:
+            # The search box adds a full text lookup
+            text_lookup = "~ " + escape(text)
+            query = f"({query}) & {text_lookup}" if query.strip() else text_lookup
         queried_keys = set()
-        item_query = filter_items(query, queried_keys=queried_keys).annotate(amount=Sum("itemlocation__amount"))
-
-        # Page query
+        error = None
+        try:
+            item_query = filter_items(query, queried_keys=queried_keys)
+        except ValueError as err:  # Malformed query, show why instead of any items
+            error = str(err)
+            item_query = Item.objects.none()
+        sort = request.GET.get("sort", "")
+        if sort:
+            try:
+                item_query = sort_items(item_query, sort)
+            except ValueError:  # No key, keep the query's order
+                pass
+
+        # Page query, the total is cached per query
         try:
-            page = int(request.GET.get("page", 1))
-            if page < 1:
-                page = 1
-        except ValueError:
-            page = 1
-        item_query = item_query[(page - 1) * self.page_size:page * self.page_size]
+            page_items, next_cursor = paginate(item_query.select_related("template"),
+                                               request.GET.get("cursor"), self.page_size)
+        except ValueError:  # Malformed cursor, start from the first page
+            page_items, next_cursor = paginate(item_query.select_related("template"), None, self.page_size)
+        Item.populate_objects(page_items)
+        total = count_items(query) if error is None else 0
+
+        # Sum up the page's stock
+        amounts = dict(ItemLocation.objects.filter(item__in=page_items)
+                                           .values_list("item_id").annotate(Sum("amount")).order_by())
 
         # Format items for react
         items = []
-        for item in Item.populate_queryset(item_query):
-            items.append({"name": str(item), "amount": 0, "url": item.url,
+        for item in page_items:
+            items.append({"name": str(item), "amount": amounts.get(item.id, 0), "url": item.url,
                           "fields": dict((key, {"value": str(model), "type": model.api_name})
                                          for key, model in item.items())})
 
@@ -106,12 +139,16 @@ class ItemListView(TemplateView):
             "js_file": "js/items/list.js",
             "css_file": "css/items/list.js",
             "props": repr(json.dumps({
+                "query": query,
+                "error": error,
                 "queriedKeys": list(queried_keys),
                 "commonKeys": list(common_keys),
                 "keys": list(queried_keys)
                       + list(common_keys.difference(queried_keys))
                       + list(keys.difference(queried_keys, common_keys)),
                 "items": items,
+                "next": next_cursor,
+                "total": total,
             })),
         })
 
@@ -138,14 +175,23 @@ class ContainerView(TemplateView):
         ct = get_object_or_404(Container, id=ct)
         try:
             depth = int(request.GET.get("depth"))
+            if depth < 1:
+                depth = 1
+        except (ValueError, TypeError):
+            depth = 1
+        try:
+            limit = int(request.GET.get("limit"))
+            if limit < 0:
+                limit = None
         except (ValueError, TypeError):
-            depth = 10
+            limit = None
         return render(request=request, template_name=self.template_name, context={
             "js_file": "js/container/browser.js",
             "css_file": "css/container/browser.css",
             "props": repr(json.dumps({
                 "root": ct.id,
-                "containers": _get_containers(Container, ct, depth),
+                "containers": _get_containers(Container, ct, depth, limit),
+                "childrenUrl": "/api/container",
             })),
         })
 
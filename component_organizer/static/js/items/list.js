@@ -6,6 +6,21 @@ import {request} from "../async.js";
 
 const e = React.createElement;
 
+function nextPageUrl(cursor) {
+    // Keep the query and search text, only replace the cursor
+    const params = new URLSearchParams(window.location.search);
+    params.set("cursor", cursor);
+    return window.location.pathname + "?" + params.toString();
+}
+
+function sortUrl(key) {
+    // Sort by the key, clicking the sorted key again reverses the order
+    const params = new URLSearchParams(window.location.search);
+    params.set("sort", params.get("sort") === key ? key + ":desc" : key);
+    params.delete("cursor");
+    return window.location.pathname + "?" + params.toString();
+}
+
 class ItemList extends React.Component {
 
     constructor(props) {
@@ -18,6 +33,8 @@ class ItemList extends React.Component {
 
         let tempQuery = window.location.search.match(/[?&]query=([^&]+)/);
         tempQuery = tempQuery ? decodeURIComponent(tempQuery[1].replace(/\+/g, ' ')) : "";
+        let tempText = window.location.search.match(/[?&]text=([^&]+)/);
+        tempText = tempText ? decodeURIComponent(tempText[1].replace(/\+/g, ' ')) : "";
         this.state = {
             keys,
             query: "",
@@ -26,9 +43,12 @@ class ItemList extends React.Component {
             queryReplace: [0, 0],
             commonKeys: [],
             commonValues: {}, // map from key to array of values
+            facets: {}, // map from key to how many matching items have it and its most common values
+            _error: this.props.error, // why the query is malformed or the facets couldn't be loaded
             suggestions: null, // is only null at start and array of strings after first change to query
             suggestionIndex: -1,
             showSuggestions: false,
+            text: tempText, // full text search, which is combined with the query by the server
             ...this.setQuery(tempQuery), // populate query, queryKey, queryValue using the http GET query
         }
 
@@ -37,6 +57,19 @@ class ItemList extends React.Component {
             this.setState({commonKeys,});
         }.bind(this));
 
+        // request the counts over all matching items not only the shown page
+        request("/api/facets?query=" + encodeURIComponent(this.props.query)).then(function ({success, result, error}) {
+            if (success) {
+                const facetMap = {};
+                result.map((facet) => {facetMap[facet.key] = facet;});
+                this.setState({facets: facetMap});
+            } else {
+                this.setState({_error: error});
+            }
+        }.bind(this)).catch(function (httpError) {
+            this.setState({_error: "Couldn't load facets: " + httpError});
+        }.bind(this));
+
         this.queryInput = React.createRef();
     }
 
@@ -178,6 +211,13 @@ class ItemList extends React.Component {
                     onFocus() {setState({showSuggestions: true})},
                     onBlur() {setState({showSuggestions: false})},
                 }),
+                e("input", {
+                    type: "search",
+                    name: "text",
+                    placeholder: "Full text search",
+                    value: this.state.text,
+                    onChange(event) {setState({text: event.target.value});},
+                }),
                 e("input", {type: "submit", value: "Search"})
             ]),
             e("div", {className: "flex-horizontal"}, [
@@ -186,7 +226,7 @@ class ItemList extends React.Component {
                 }, [
                     e("thead", {}, e("tr", {}, [
                         e("th"),
-                        ...shownKeys.map((key) => e("th", {}, key)),
+                        ...shownKeys.map((key) => e("th", {}, e("a", {href: sortUrl(key)}, key))),
                         e("th", {}, "#"),
                     ])),
                     e("tbody", {}, this.props.items.map(({name, url, amount, fields}) => (
@@ -208,6 +248,9 @@ class ItemList extends React.Component {
                     style: {alignItems: "start"},
                 }, this.props.keys.map((key) => e("div", {
                     style: {cursor: "pointer"},
+                    title: this.state.facets[key] ?
+                        this.state.facets[key].values.map(({value, count}) => value + " (" + count + ")").join("\n")
+                        : "",
                     onClick() {
                         setState((state) => ({
                             keys: {
@@ -218,8 +261,13 @@ class ItemList extends React.Component {
                     },
                 }, [e("span", {
                     style: {color: this.state.keys[key] ? "white" : "gray"},
-                }, "\u2022 "), key]))),
+                }, "\u2022 "), key, this.state.facets[key] ? " (" + this.state.facets[key].count + ")" : ""]))),
+            ]),
+            e("div", {}, [
+                this.props.total + " items",
+                ...(this.props.next ? [" ", e("a", {href: nextPageUrl(this.props.next)}, "Next page")] : []),
             ]),
+            this.state._error ? e("span", {style: {color: "red"}}, this.state._error) : null,
             e("form", {action: "/item/new"}, e("button", {type: "submit"}, "Create new item")),
         ]);
     }
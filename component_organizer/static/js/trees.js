@@ -1,4 +1,5 @@
 import React from "./react.js";
+import {request} from "./async.js";
 
 const e = React.createElement;
 
@@ -8,9 +9,14 @@ export class ContainerTree extends React.Component {
         super(props);
         this.state = {
             openContainers: {},
+            containers: {...this.props.containers},
+            nextCursors: {},
         };
         for (const ct in this.props.containers) {
             this.state.openContainers[ct] = false;
+            if (this.props.containers[ct].next !== undefined) {
+                this.state.nextCursors[ct] = this.props.containers[ct].next;
+            }
         }
         this.state.openContainers[this.props.root] = true;
         for (let i = 0; i < this.props.initiallyOpened.length; i++) {
@@ -22,9 +28,50 @@ export class ContainerTree extends React.Component {
         }
     }
 
+    loadChildren(ct, cursor = null) {
+        const {childrenUrl} = this.props;
+        if (childrenUrl === null) {
+            return;
+        }
+
+        request(`${childrenUrl}/${ct}/children` + (cursor === null ? "" : `?cursor=${cursor}`)).then(
+            ({success, result}) => {
+                if (!success) {
+                    return;
+                }
+                this.setState((state) => {
+                    const previous = cursor === null ? [] : (state.containers[ct].children || []);
+                    return {
+                        containers: {
+                            ...state.containers,
+                            ...result.nodes,
+                            [ct]: {...state.containers[ct], children: [...previous, ...result.children]},
+                        },
+                        nextCursors: {...state.nextCursors, [ct]: result.next},
+                    };
+                });
+            }
+        ).catch(console.error);
+    }
+
+    open(ct, toggle = false) {
+        const opened = toggle ? !this.state.openContainers[ct] : true;
+        if (opened && this.state.containers[ct].children === null) {
+            this.loadChildren(ct);
+        }
+        this.setState((state) => ({
+            openContainers: {
+                ...state.openContainers,
+                [ct]: opened,
+            }
+        }));
+    }
+
     renderContainer(ct, style = {}) {
-        const setState = this.setState.bind(this);
-        const {name, children} = this.props.containers[ct];
+        const open = this.open.bind(this);
+        const loadChildren = this.loadChildren.bind(this);
+        const {name, children, totalAmount} = this.state.containers[ct];
+        const nextCursor = this.state.nextCursors[ct];
         const {openContainer, createContainer} = this.props;
 
         function CreateContainer({ct}) {
@@ -46,32 +93,28 @@ export class ContainerTree extends React.Component {
                 e("td", {
                     colSpan: 2,
                     onClick() {
-                        setState((state) => ({
-                            openContainers: {
-                                ...state.openContainers,
-                                [ct]: !state.openContainers[ct],
-                            }
-                        }));
+                        open(ct, true);
                     },
                 }, e("img", {src: "/static/img/caret_down.svg", className: this.state.openContainers[ct] ? "" : "closed-caret"})),
                 e("td", {
                     onClick() {
                         openContainer(ct);
-                        setState((state) => ({
-                            openContainers: {
-                                ...state.openContainers,
-                                [ct]: true,
-                            }
-                        }));
+                        open(ct);
                     },
-                }, name),
+                }, totalAmount === undefined ? name : `${name} (${totalAmount})`),
             ]),
-            ...(this.state.openContainers[ct] ? [e(CreateContainer, {ct,}), ...children.map(
+            ...(this.state.openContainers[ct] ? [e(CreateContainer, {ct,}), ...(children || []).map(
                 (child) => e("tr", {}, [
                     e("td"), e("td"),
                     e("td", {}, this.renderContainer(child))
                 ])
-            )] : []),
+            ), ...(nextCursor ? [e("tr", {}, [
+                e("td"), e("td"),
+                e("td", {
+                    className: "darker",
+                    onClick() {loadChildren(ct, nextCursor);}, style: {cursor: "pointer"}
+                }, "Load more"),
+            ])] : [])] : []),
         ]);
     }
 
@@ -84,6 +127,7 @@ ContainerTree.defaultProps = {
     openContainer: function (ct) {console.log("Opened container with id: ", ct);},
     root: 0,
     initiallyOpened: [],
+    childrenUrl: null,  // for example "/api/container", used to lazily load children which are null
     containers: {
         0: {
             name: "Dummy Root",